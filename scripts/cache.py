@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+def fingerprint(*parts):
+    """
+    Calcule une empreinte stable (hexadécimale) de paramètres et de données, utilisée comme clé de cache.
+
+    Parameters:
+        *parts: objets à combiner (dict/list/str/nombres sérialisables en JSON, np.ndarray, pd.Series ou pd.DataFrame)
+
+    Returns:
+        str: l'empreinte blake2b (16 octets) des éléments fournis
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, (pd.Series, pd.DataFrame)):
+            digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+        elif isinstance(part, np.ndarray):
+            digest.update(str((part.dtype, part.shape)).encode())
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class PickleCache:
+    """
+    Cache disque simple : un fichier pickle par clé (typiquement une empreinte calculée avec fingerprint).
+
+    Attributs:
+        directory (str): Dossier contenant les fichiers du cache
+
+    Methods:
+        get(key, default): Renvoie l'objet associé à la clé (ou default)
+        set(key, value): Enregistre l'objet associé à la clé (écriture atomique)
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def get(self, key, default=None):
+        try:
+            with open(self.path(key), "rb") as file:
+                return pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return default
+
+    def set(self, key, value):
+        temporary_path = self.path(key) + f".{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            pickle.dump(value, file)
+        os.replace(temporary_path, self.path(key))
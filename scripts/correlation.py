@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+from scipy.special import ndtri
+from scripts.processor.partition import HexPartitionedData
+
+class CorrelationEngine:
+    """
+    Classe qui calcule les autocorrélations (ACF) et autocorrélations partielles (PACF) de toutes les séries à la fois.
+
+    L'ACF de toutes les séries d'un tableau (n_series, n_dates) est obtenue jusqu'au lag K en une seule passe de FFT
+    (estimateur biaisé, identique à statsmodels.tsa.stattools.acf), la PACF par l'algorithme de Durbin-Levinson vectorisé
+    sur les séries (identique à la méthode 'ywm' utilisée par plot_pacf). Les valeurs manquantes sont remplacées par la
+    moyenne de la série.
+
+    Attributs:
+        nlags (int): Nombre de lags calculés par défaut
+
+    Methods:
+        acf(series, nlags): ACF de chaque ligne du tableau
+        pacf(acf): PACF à partir des ACF
+        acf_confint(acf, nobs, alpha): Demi-largeurs des intervalles de confiance de l'ACF (formule de Bartlett)
+        pacf_confint(nobs, nlags, alpha): Demi-largeur de l'intervalle de confiance de la PACF
+        from_frame(data, variable): Tableau dense (n_hex, n_dates) d'une variable
+        lag_correlation_map(data, variable, lags, partial): ACF (ou PACF) par hexagone aux lags demandés
+    """
+
+    def __init__(self, nlags=30):
+        self.nlags = nlags
+
+    def acf(self, series, nlags=None):
+        """
+        Parameters:
+            series (np.ndarray): tableau (n_series, n_dates) ou série unique
+            nlags (int): nombre de lags (par défaut self.nlags)
+
+        Returns:
+            np.ndarray: ACF (n_series, nlags + 1), le lag 0 valant 1
+        """
+        nlags = self.nlags if nlags is None else nlags
+        series = np.atleast_2d(np.asarray(series, dtype=float))
+        centered = series - np.nanmean(series, axis=1, keepdims=True)
+        centered = np.nan_to_num(centered)
+        n_dates = series.shape[1]
+        n_fft = 1 << int(np.ceil(np.log2(2 * n_dates - 1)))
+        spectrum = np.fft.rfft(centered, n=n_fft, axis=1)
+        autocovariance = np.fft.irfft(spectrum * np.conj(spectrum), n=n_fft, axis=1)[:, :nlags + 1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return autocovariance / autocovariance[:, :1]
+
+    @staticmethod
+    def pacf(acf):
+        """
+        Parameters:
+            acf (np.ndarray): ACF (n_series, nlags + 1) issues de acf
+
+        Returns:
+            np.ndarray: PACF (n_series, nlags + 1), le lag 0 valant 1
+        """
+        acf = np.atleast_2d(acf)
+        n_series, n_lags = acf.shape[0], acf.shape[1] - 1
+        pacf = np.ones_like(acf)
+        if n_lags == 0:
+            return pacf
+        phi = np.zeros((n_series, n_lags + 1))
+        phi[:, 1] = pacf[:, 1] = acf[:, 1]
+        sigma = 1 - acf[:, 1] ** 2
+        for k in range(2, n_lags + 1):
+            reflection = (acf[:, k] - np.einsum("nj,nj->n", phi[:, 1:k], acf[:, k - 1:0:-1])) / sigma
+            phi[:, 1:k] = phi[:, 1:k] - reflection[:, None] * phi[:, k - 1:0:-1]
+            phi[:, k] = pacf[:, k] = reflection
+            sigma = sigma * (1 - reflection ** 2)
+        return pacf
+
+    @staticmethod
+    def acf_confint(acf, nobs, alpha=0.05):
+        variance = np.ones_like(acf) / nobs
+        variance[:, 0] = 0
+        variance[:, 1] = 1 / nobs
+        variance[:, 2:] *= 1 + 2 * np.cumsum(acf[:, 1:-1] ** 2, axis=1)
+        return ndtri(1 - alpha / 2) * np.sqrt(variance)
+
+    @staticmethod
+    def pacf_confint(nobs, nlags, alpha=0.05):
+        halfwidth = np.full(nlags + 1, ndtri(1 - alpha / 2) / np.sqrt(nobs))
+        halfwidth[0] = 0
+        return halfwidth
+
+    @staticmethod
+    def from_frame(data, variable):
+        """
+        Returns:
+            tuple: (hexagones, dates, tableau (n_hex, n_dates)) cf HexPartitionedData.to_dense
+        """
+        if not isinstance(data, HexPartitionedData):
+            data = HexPartitionedData(data)
+        return data.to_dense(variable)
+
+    def lag_correlation_map(self, data, variable="precip", lags=(1,), partial=False):
+        """
+        Calcule, pour chaque hexagone, l'autocorrélation (ou l'autocorrélation partielle) d'une variable aux lags demandés.
+
+        Parameters:
+            data (pd.DataFrame ou HexPartitionedData): données contenant h3_hex_id, date et la variable
+            variable (str): variable étudiée
+            lags (list): lags renvoyés
+            partial (bool): PACF au lieu de l'ACF
+
+        Returns:
+            pd.DataFrame: une ligne par hexagone, colonnes h3_hex_id puis lag_k
+        """
+        hexagones, _, dense = self.from_frame(data, variable)
+        correlations = self.acf(dense, max(lags))
+        if partial:
+            correlations = self.pacf(correlations)
+        result = pd.DataFrame(correlations[:, list(lags)], columns=[f"lag_{lag}" for lag in lags])
+        result.insert(0, "h3_hex_id", hexagones)
+        return result
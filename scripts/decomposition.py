@@ -0,0 +1,209 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import warnings
+import numpy as np
+import pandas as pd
+from scripts.cache import PickleCache, fingerprint
+from scripts.processor.partition import HexPartitionedData
+
+
+def _decompose(values, periods, robust):
+    """
+    Décompose une série (exécuté dans un processus du pool) : STL pour une seule période, MSTL pour plusieurs.
+
+    Retourne :
+    - components (dict) : 'trend', 'resid' (n,) et 'seasonal' (n, n_periods)
+    """
+    from statsmodels.tsa.seasonal import MSTL, STL
+
+    values = pd.Series(values).interpolate(limit_direction="both").to_numpy()
+    if len(periods) == 1:
+        result = STL(values, period=periods[0], robust=robust).fit()
+        seasonal = np.asarray(result.seasonal)[:, None]
+    else:
+        result = MSTL(values, periods=periods, stl_kwargs={"robust": robust}).fit()
+        seasonal = np.asarray(result.seasonal).reshape(len(values), -1)
+    return {"trend": np.asarray(result.trend), "seasonal": seasonal, "resid": np.asarray(result.resid)}
+
+
+class STLDecomposer:
+    """
+    Classe STLDecomposer : service de décomposition saisonnière (STL, ou MSTL hebdomadaire + annuelle) pour de nombreux hexagones.
+
+    Les décompositions manquantes sont calculées dans un pool de processus ; les composantes (tendance, saisonnalité, résidus)
+    sont conservées dans un cache indexé par l'empreinte de la série et par les périodes, en mémoire (borné à max_cached entrées,
+    les moins récemment utilisées étant évincées) et optionnellement sur disque.
+    Elles servent à l'affichage (TimeSeriesPlots.plot_stl_decomposition) et comme variables désaisonnalisées pour les modèles.
+    Les valeurs manquantes sont interpolées linéairement avant décomposition.
+
+    Attributs :
+    - periods (tuple) : Périodes saisonnières (ex: (365,) ou (7, 365))
+    - robust (bool) : Ajustement STL robuste aux valeurs extrêmes
+    - n_jobs (int) : Nombre de processus du pool (None : nombre de CPU, 1 : pas de pool)
+    - max_cached (int) : Nombre maximal de décompositions gardées en mémoire (None : pas de limite)
+    - cache (OrderedDict) : Décompositions déjà calculées, par empreinte, de la moins à la plus récemment utilisée
+    - disk_cache (PickleCache) : Cache disque optionnel
+
+    Methods :
+    - decompose(series, periods) : Décompose une série (pd.Series indexée par les dates)
+    - run(data, variable, hexagones) : Décompose la variable de chaque hexagone
+    - deseasonalize(data, variable, hexagones, train_end) : Ajoute la variable désaisonnalisée et la tendance aux données
+      (décomposition ajustée sur la période d'entraînement, prolongée sur la période de test)
+    """
+
+    def __init__(self, periods=(365,), robust=False, n_jobs=None, cache_dir=None, max_cached=None):
+        self.periods = tuple(periods)
+        self.robust = robust
+        self.n_jobs = n_jobs
+        self.max_cached = max_cached
+        self.cache = OrderedDict()
+        self.disk_cache = PickleCache(cache_dir) if cache_dir else None
+
+    def _key(self, values, periods):
+        return fingerprint(np.asarray(values, dtype=float), list(periods), self.robust)
+
+    def _remember(self, key, components):
+        self.cache[key] = components
+        self.cache.move_to_end(key)
+        if self.max_cached is not None:
+            while len(self.cache) > self.max_cached:
+                self.cache.popitem(last=False)
+
+    def _lookup(self, key):
+        components = self.cache.get(key)
+        if components is None and self.disk_cache is not None:
+            components = self.disk_cache.get(key)
+        if components is not None:
+            self._remember(key, components)
+        return components
+
+    def _store(self, key, components):
+        self._remember(key, components)
+        if self.disk_cache is not None:
+            self.disk_cache.set(key, components)
+
+    def _to_frame(self, series, components, periods):
+        frame = pd.DataFrame({"observed": series.to_numpy(dtype=float), "trend": components["trend"]}, index=series.index)
+        if len(periods) == 1:
+            frame["seasonal"] = components["seasonal"][:, 0]
+        else:
+            for i, period in enumerate(periods):
+                frame[f"seasonal_{period}"] = components["seasonal"][:, i]
+            frame["seasonal"] = components["seasonal"].sum(axis=1)
+        frame["resid"] = components["resid"]
+        return frame
+
+    def decompose(self, series, periods=None):
+        """
+        Paramètres :
+        - series (pd.Series) : série indexée par les dates
+        - periods (tuple) : périodes (par défaut self.periods)
+
+        Retourne :
+        - components (pd.DataFrame) : colonnes observed, trend, seasonal (et seasonal_<période> si plusieurs périodes), resid
+        """
+        periods = self.periods if periods is None else tuple(periods)
+        key = self._key(series.to_numpy(dtype=float), periods)
+        components = self._lookup(key)
+        if components is None:
+            components = _decompose(series.to_numpy(dtype=float), periods, self.robust)
+            self._store(key, components)
+        return self._to_frame(series, components, periods)
+
+    def run(self, data, variable="precip_mean", hexagones=None):
+        """
+        Décompose la variable de chaque hexagone, en parallèle pour les séries absentes du cache.
+
+        Paramètres :
+        - data (pd.DataFrame ou HexPartitionedData) : données contenant h3_hex_id, date et la variable
+        - variable (str) : variable décomposée
+        - hexagones (list) : hexagones traités (par défaut tous)
+
+        Retourne :
+        - decompositions (dict) : {hexagone: DataFrame des composantes}
+        """
+        if not isinstance(data, HexPartitionedData):
+            data = HexPartitionedData(data)
+        hexagones = data.hexagones if hexagones is None else [hex_id for hex_id in hexagones if hex_id in data]
+        series = {hex_id: pd.Series(data.values(variable, hex_id).astype(float), index=pd.to_datetime(data.values(data.time_column, hex_id))) for hex_id in hexagones}
+        keys = {hex_id: self._key(values.to_numpy(), self.periods) for hex_id, values in series.items()}
+        # composantes conservées localement : le cache mémoire peut évincer une partie des hexagones pendant l'appel
+        components = {hex_id: self._lookup(keys[hex_id]) for hex_id in hexagones}
+        pending = [hex_id for hex_id in hexagones if components[hex_id] is None]
+
+        if pending:
+            arguments = ([series[hex_id].to_numpy() for hex_id in pending], [self.periods] * len(pending), [self.robust] * len(pending))
+            if self.n_jobs == 1:
+                outputs = list(map(_decompose, *arguments))
+            else:
+                with ProcessPoolExecutor(self.n_jobs) as executor:
+                    outputs = list(executor.map(_decompose, *arguments))
+            for hex_id, output in zip(pending, outputs):
+                components[hex_id] = output
+                self._store(keys[hex_id], output)
+
+        return {hex_id: self._to_frame(series[hex_id], components[hex_id], self.periods) for hex_id in hexagones}
+
+    @staticmethod
+    def _daily_calendar(data, variable):
+        """
+        Complète chaque hexagone en calendrier journalier continu (jours manquants à NaN, interpolés par _decompose) :
+        STL/MSTL et le prolongement des composantes comptent les périodes en jours, pas en lignes.
+        """
+        data = data[["h3_hex_id", "date", variable]].assign(date=pd.to_datetime(data["date"]).dt.normalize())
+        bounds = data.groupby("h3_hex_id")["date"].agg(["min", "max"])
+        calendar = pd.concat([pd.DataFrame({"h3_hex_id": hex_id, "date": pd.date_range(start, stop, freq="D")})
+                              for hex_id, start, stop in bounds.itertuples()], ignore_index=True)
+        return calendar.merge(data.drop_duplicates(["h3_hex_id", "date"], keep="last"), on=["h3_hex_id", "date"], how="left")
+
+    def _extend(self, frame, dates):
+        """
+        Prolonge les composantes d'une décomposition journalière au-delà de sa dernière date : chaque saisonnalité
+        reprend sa valeur à la même position du dernier cycle (date - k périodes), la tendance reste à sa dernière valeur.
+        """
+        dates = pd.DatetimeIndex(dates)
+        offsets = (dates - frame.index[-1]).days.to_numpy()
+        columns = ["seasonal"] if len(self.periods) == 1 else [f"seasonal_{period}" for period in self.periods]
+        seasonal = 0.0
+        for column, period in zip(columns, self.periods):
+            sources = dates - pd.to_timedelta(((offsets - 1) // period + 1) * period, unit="D")
+            seasonal = seasonal + frame[column].reindex(sources).to_numpy()
+        return pd.DataFrame({"seasonal": seasonal, "trend": frame["trend"].iloc[-1]}, index=dates)
+
+    def deseasonalize(self, data, variable="precip_mean", hexagones=None, train_end=None):
+        """
+        Ajoute aux données les colonnes <variable>_deseason (observé - saisonnalité) et <variable>_trend, utilisables comme features.
+
+        STL et MSTL sont des lissages bilatéraux : décomposer toute la série ferait dépendre les valeurs d'entraînement des
+        observations de la période de test. Avec train_end, la décomposition n'est ajustée que sur les dates <= train_end et,
+        au-delà, chaque saisonnalité répète son dernier cycle et la tendance reste à sa dernière valeur.
+
+        Paramètres :
+        - data (pd.DataFrame) : données journalières contenant h3_hex_id, date et la variable (les jours manquants sont
+          interpolés pour la décomposition, cf _daily_calendar)
+        - variable (str) : variable décomposée
+        - hexagones (list) : hexagones traités (par défaut tous)
+        - train_end (str ou Timestamp) : dernière date d'entraînement (ex: date maximale - 7 jours pour MLDataSet) ;
+          si None, toute la série est décomposée (avertissement : les features intègrent la période de test)
+
+        Retourne :
+        - data (pd.DataFrame) : copie des données avec les deux colonnes supplémentaires (NaN pour les hexagones non traités)
+        """
+        dates = pd.to_datetime(data["date"])
+        if train_end is None:
+            warnings.warn("deseasonalize sans train_end : la décomposition couvre la période de test (fuite d'information dans les features)")
+            decompositions = self.run(self._daily_calendar(data, variable), variable, hexagones)
+        else:
+            train_end = pd.Timestamp(train_end)
+            decompositions = self.run(self._daily_calendar(data[dates <= train_end], variable), variable, hexagones)
+            future = pd.DataFrame({"h3_hex_id": data["h3_hex_id"].to_numpy(), "date": dates.to_numpy()})[(dates > train_end).to_numpy()]
+            for hex_id, hex_dates in future.groupby("h3_hex_id")["date"]:
+                if hex_id in decompositions:
+                    frame = decompositions[hex_id][["seasonal", "trend"]]
+                    decompositions[hex_id] = pd.concat([frame, self._extend(decompositions[hex_id], hex_dates.sort_values().unique())])
+        components = pd.concat({hex_id: frame[["seasonal", "trend"]] for hex_id, frame in decompositions.items()}, names=["h3_hex_id", "date"]).reset_index()
+        data = data.copy()
+        merged = pd.DataFrame({"h3_hex_id": data["h3_hex_id"].to_numpy(), "date": dates.to_numpy()}).merge(components, on=["h3_hex_id", "date"], how="left")
+        data[f"{variable}_deseason"] = data[variable].to_numpy() - merged["seasonal"].to_numpy()
+        data[f"{variable}_trend"] = merged["trend"].to_numpy()
+        return data
@@ -1,6 +1,7 @@
-from scipy import stats
 import dask.dataframe as dd
 from scripts.extractor.h3 import H3Processor
+from scripts.processor.cube import HexTimeCube
+from scripts.profiling import stage
 import os
 
 class DaskDatabaseBuilder:
@@ -23,6 +24,7 @@ class DaskDatabaseBuilder:
         load_data(x): Récupère les données dans le repo indiqué puis concatène en un dataframe dask (pour csv)
         process_data(data,stations): Concatène les informations des stations, dont les hex_id, puis fait l'aggrégation par hex_id par heure
         export_data(filename): Exporte les données pré-traitées
+        export_cube(path, chunk_hours): Exporte les données pré-traitées en cube hexagone × heure × variable (HexTimeCube)
     """
     def __init__(self,hex_size=3):
         self.hex_size=hex_size
@@ -43,6 +45,8 @@ class DaskDatabaseBuilder:
 
     @staticmethod
     def mode(x):
+        from scipy import stats
+
         return stats.mode(x)[0][0]
 
     def load_data(self,folder):
@@ -53,19 +57,30 @@ class DaskDatabaseBuilder:
         # Definition h3 (cf H3Processor pour plus de détails):
         h3_processor = H3Processor(self.hex_size)
         # 1) Récupère les caractéristiques des stations + les caractéristiques H3 (voisins,id, coordonnées,etc...)
-        self.stations = self.data[["number_sta","lat","lon","height_sta"]].drop_duplicates(subset="number_sta").compute()
+        with stage("database.stations") as step:
+            self.stations = self.data[["number_sta","lat","lon","height_sta"]].drop_duplicates(subset="number_sta").compute()
+            step.rows_out = len(self.stations)
         self.stations_post_h3=h3_processor.get_h3_components(self.stations)
         # 2) Convertir la colonne 'date' en datetime et arrondir à l'heure + groupby par station/date
-        self.data["date"] = dd.to_datetime(self.data["date"], format="%Y%m%d %H:%M").dt.round("H")
-        data_grouped_by_stations = self.data.groupby(["number_sta", "date"])[self.indicators].mean().reset_index().compute()
+        with stage("database.group_by_station") as step:
+            self.data["date"] = dd.to_datetime(self.data["date"], format="%Y%m%d %H:%M").dt.round("H")
+            data_grouped_by_stations = self.data.groupby(["number_sta", "date"])[self.indicators].mean().reset_index().compute()
+            step.rows_out = len(data_grouped_by_stations)
         # 3) Merge les données avec les informations de l'aggrégateur (+ les voisins)
-        self.data_with_hex = dd.merge(data_grouped_by_stations, self.stations_post_h3[["number_sta", "h3_hex_id", "h3_hex_id_neighbor_0", "h3_hex_id_neighbor_1", "h3_hex_id_neighbor_2"]], how="left", on="number_sta")
+        with stage("database.merge_hex", rows_in=len(data_grouped_by_stations)):
+            self.data_with_hex = dd.merge(data_grouped_by_stations, self.stations_post_h3[["number_sta", "h3_hex_id", "h3_hex_id_neighbor_0", "h3_hex_id_neighbor_1", "h3_hex_id_neighbor_2"]], how="left", on="number_sta")
         # 4) Groupby selon les méthodes définies dans la cellule précédente
-        self.preprocessed_data = self.data_with_hex.groupby([self.aggregator, "date"]).agg(self.agg_methods)
-        self.preprocessed_data=self.preprocessed_data.reset_index()
+        with stage("database.group_by_hex", rows_in=len(self.data_with_hex)) as step:
+            self.preprocessed_data = self.data_with_hex.groupby([self.aggregator, "date"]).agg(self.agg_methods)
+            self.preprocessed_data=self.preprocessed_data.reset_index()
+            step.rows_out = len(self.preprocessed_data)
         # 5) Rajouter les précipitations aggrégées des hexagones voisins
         self.preprocessed_data=h3_processor.add_h3_neighbor_precipitation(self.preprocessed_data) 
         return self.preprocessed_data
     
     def export_data(self, filename):
-        self.preprocessed_data.to_csv(filename, index=False)
\ No newline at end of file
+        self.preprocessed_data.to_csv(filename, index=False)
+
+    def export_cube(self, path, chunk_hours=24 * 28):
+        variables = self.indicators + [f"h3_hex_id_neighbor_{i}_precip" for i in range(self.hex_size)]
+        return HexTimeCube.write(self.preprocessed_data, path, variables, self.aggregator, "date", freq="H", chunk_size=chunk_hours)
\ No newline at end of file
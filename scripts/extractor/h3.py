@@ -1,7 +1,7 @@
 from h3 import h3
 import pandas as pd
 import json
-import plotly.graph_objects as go
+from scripts.profiling import stage
 
 class H3Processor:
     """
@@ -30,17 +30,19 @@ class H3Processor:
         Returns :
         json_hex_ids (pandas.DataFrame) : le nouveau DataFrame contenant les identifiants de chaque hexagone H3 pour chaque point ainsi que les identifiants de chaque hexagone H3 voisin pour chaque point.
         """
-        df['h3_hex_id'] = df.apply(lambda row: h3.geo_to_h3(row['lat'], row['lon'], self.hex_size), axis=1)
-        df['h3_hex_id_neighbor'] = df.apply(lambda row: h3.k_ring(row['h3_hex_id']), axis=1)
-
-        df["h3_hex_id_neighbor"] = df["h3_hex_id_neighbor"].apply(lambda x: list(x))
-        neighbors = df["h3_hex_id_neighbor"].apply(pd.Series)
-        df.drop(columns=["h3_hex_id_neighbor"])
-        neighbors = neighbors.add_prefix('h3_hex_id_neighbor_')
-        neighbors = neighbors.iloc[:, 0:3]
-        df['geometry'] = df['h3_hex_id'].apply(lambda x: {"type": "Polygon",
-                                                           "coordinates": [h3.h3_to_geo_boundary(x, geo_json=True)]})
-        json_hex_ids = pd.concat([df, neighbors], axis=1)
+        with stage("h3.get_h3_components", rows_in=len(df)) as step:
+            df['h3_hex_id'] = df.apply(lambda row: h3.geo_to_h3(row['lat'], row['lon'], self.hex_size), axis=1)
+            df['h3_hex_id_neighbor'] = df.apply(lambda row: h3.k_ring(row['h3_hex_id']), axis=1)
+
+            df["h3_hex_id_neighbor"] = df["h3_hex_id_neighbor"].apply(lambda x: list(x))
+            neighbors = df["h3_hex_id_neighbor"].apply(pd.Series)
+            df.drop(columns=["h3_hex_id_neighbor"])
+            neighbors = neighbors.add_prefix('h3_hex_id_neighbor_')
+            neighbors = neighbors.iloc[:, 0:3]
+            df['geometry'] = df['h3_hex_id'].apply(lambda x: {"type": "Polygon",
+                                                               "coordinates": [h3.h3_to_geo_boundary(x, geo_json=True)]})
+            json_hex_ids = pd.concat([df, neighbors], axis=1)
+            step.rows_out = len(json_hex_ids)
         return json_hex_ids
 
     def get_geojson_from_h3(self, df):
@@ -79,65 +81,26 @@ class H3Processor:
         - h3_precipitation (pandas.DataFrame): le dataframe contenant les identifiants H3 pour chaque point, 
         les identifiants H3 des voisins pour chaque point et les données de précipitation pour chaque point et chaque voisin.
         """
-        temp_data=df.copy()
-        for i in range(self.hex_size):
-            neighbor_hex_column =   "h3_hex_id_neighbor_" + str(i)
-            neighbor_df=temp_data[["h3_hex_id_neighbor_"+str(i),"date"]]
-            values_for_neighbors=temp_data[["h3_hex_id","date","precip"]].rename(columns={"h3_hex_id":neighbor_hex_column})
-            neighbor=pd.merge(neighbor_df,values_for_neighbors,on=["date",neighbor_hex_column])[["precip"]].rename(columns={"precip":f"h3_hex_id_neighbor_{i}_precip"})
-            df=pd.concat([df,neighbor],axis=1)
-            df[f"h3_hex_id_neighbor_{i}_precip"] = df.apply(lambda row: row["precip"] if pd.isna(row[f"h3_hex_id_neighbor_{i}_precip"]) else row[f"h3_hex_id_neighbor_{i}_precip"],axis=1)
+        with stage("h3.add_h3_neighbor_precipitation", rows_in=len(df)) as step:
+            temp_data=df.copy()
+            for i in range(self.hex_size):
+                neighbor_hex_column =   "h3_hex_id_neighbor_" + str(i)
+                neighbor_df=temp_data[["h3_hex_id_neighbor_"+str(i),"date"]]
+                values_for_neighbors=temp_data[["h3_hex_id","date","precip"]].rename(columns={"h3_hex_id":neighbor_hex_column})
+                neighbor=pd.merge(neighbor_df,values_for_neighbors,on=["date",neighbor_hex_column])[["precip"]].rename(columns={"precip":f"h3_hex_id_neighbor_{i}_precip"})
+                df=pd.concat([df,neighbor],axis=1)
+                df[f"h3_hex_id_neighbor_{i}_precip"] = df.apply(lambda row: row["precip"] if pd.isna(row[f"h3_hex_id_neighbor_{i}_precip"]) else row[f"h3_hex_id_neighbor_{i}_precip"],axis=1)
+            step.rows_out = len(df)
         return df
     
     def plot_hexagons_on_mapbox(self, df, color='red'):
         """
-        Cette méthode génère un graphique de type Scattermapbox avec des hexagones H3 et des stations météorologiques.
+        Affiche les hexagones H3 et les stations météorologiques sur une carte (cf scripts.plotter.maps).
 
         Parameters:
             df (DataFrame): Le DataFrame contenant les données des stations météorologiques.
-            hex_resolution (int): La résolution des hexagones H3 à afficher.
             color (str): La couleur des hexagones H3.
-
-        Returns:
-            None: Affiche le graphique interactif.
         """
-        stations=df.copy()
-        stations=self.get_h3_components(stations)
-        hexagons = stations['h3_hex_id'].unique().tolist()
-
-        hexagon_features = []
-        for hex in hexagons:
-            polygon = h3.h3_to_geo_boundary(hex, geo_json=True)
-            hexagon_feature = {"type": "Feature",
-                            "geometry": {"type": "Polygon", "coordinates": [polygon]}}
-            hexagon_features.append(hexagon_feature)
-
-        hexagon_collection = {"type": "FeatureCollection", "features": hexagon_features}
-
-        hexagon_traces = []
-        for feature in hexagon_collection['features']:
-            trace = go.Scattermapbox(
-                lat=[feature['geometry']['coordinates'][0][i][1] for i in range(7)],
-                lon=[feature['geometry']['coordinates'][0][i][0] for i in range(7)],
-                mode='lines',
-                line=dict(width=1, color=color),
-                fill='none',
-                showlegend=False,
-                hoverinfo='none')
-            hexagon_traces.append(trace)
-
-        station_trace = go.Scattermapbox(
-            lat=stations['lat'],
-            lon=stations['lon'],
-            mode='markers',
-            showlegend=False,
-            marker=dict(size=3, color='black', opacity=0.5),
-            hoverinfo='text',
-            text=stations['number_sta'])
-
-        layout = go.Layout(mapbox_style="open-street-map",mapbox_zoom=4,  # Set the initial zoom level
-            mapbox_center={"lat": stations['lat'].mean(), "lon": stations['lon'].mean()})
-
-        fig = go.Figure(data=hexagon_traces + [station_trace], layout=layout)
+        from scripts.plotter.maps import plot_hexagons_on_mapbox
 
-        fig.show()
+        plot_hexagons_on_mapbox(self.get_h3_components(df.copy()), color)
@@ -0,0 +1,119 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("tensorflow", "plotly", "matplotlib", "statsmodels", "sklearn", "pmdarima")
+
+# module d'entrée : (budget de durée de l'import à froid en secondes, modules lourds autorisés à l'import)
+ENTRY_MODULES = {
+    "scripts.pipeline": (1.0, ()),
+    "scripts.profiling": (1.0, ()),
+    "scripts.extractor.h3": (1.0, ()),
+    "scripts.extractor.database_builder": (2.5, ()),
+    "scripts.processor.feature_processor": (1.0, ()),
+    "scripts.processor.partition": (1.0, ()),
+    "scripts.processor.spatial": (1.0, ()),
+    "scripts.processor.cube": (1.0, ()),
+    "scripts.modeler.dataset": (1.0, ()),
+    "scripts.modeler.sarimax": (1.0, ()),
+    "scripts.modeler.online": (1.0, ()),
+    "scripts.modeler.probabilistic": (1.0, ()),
+    "scripts.modeler.lstm": (1.0, ()),
+    "scripts.modeler.auto_arima": (1.0, ()),
+    "scripts.modeler.search": (1.0, ()),
+    "scripts.timeseries": (1.0, ()),
+    "scripts.correlation": (1.0, ()),
+    "scripts.decomposition": (1.0, ()),
+    "scripts.plotter.rendering": (2.0, ("plotly",)),
+    "scripts.plotter.overview": (2.5, ("plotly",)),
+    "scripts.plotter.timeseries": (2.5, ("plotly",)),
+}
+
+_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted({{name.split('.')[0] for name in sys.modules}} & set({heavy!r}))
+print(json.dumps({{"seconds": elapsed, "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, "heavy": heavy}}))
+"""
+
+
+def measure(module, repeat=3):
+    """
+    Importe un module dans des interpréteurs neufs (import à froid) et mesure la durée de l'import.
+
+    Parameters:
+        module (str): module importé
+        repeat (int): nombre d'interpréteurs lancés
+
+    Returns:
+        dict: durée médiane (s), RSS maximal du processus (Mo), modules lourds chargés par l'import,
+        et le message d'erreur si l'import échoue
+    """
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)], capture_output=True, text=True)
+        if output.returncode != 0:
+            error = output.stderr.strip().splitlines()
+            return {"seconds": float("nan"), "rss_mb": float("nan"), "heavy": [], "error": error[-1] if error else f"code {output.returncode}"}
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {"seconds": statistics.median(run["seconds"] for run in runs), "rss_mb": max(run["rss_mb"] for run in runs), "heavy": runs[-1]["heavy"], "error": None}
+
+
+def slowest_imports(module, n=10):
+    """
+    Returns:
+        list: les n imports les plus longs (durée cumulée en s, module) selon python -X importtime
+    """
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True)
+    timings = []
+    for line in output.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+            if cumulative.isdigit():
+                timings.append((int(cumulative) / 1e6, name))
+    return sorted(timings, reverse=True)[:n]
+
+
+def run(modules=None, repeat=3):
+    """
+    Vérifie, pour chaque module d'entrée, que l'import à froid respecte son budget et ne charge pas de module lourd non autorisé.
+
+    Returns:
+        list: un dictionnaire par module (module, seconds, budget, rss_mb, heavy, unexpected, error, ok)
+    """
+    results = []
+    for module in modules or ENTRY_MODULES:
+        budget, allowed = ENTRY_MODULES.get(module, (float("inf"), ()))
+        measurement = measure(module, repeat)
+        unexpected = [name for name in measurement["heavy"] if name not in allowed]
+        results.append(dict(module=module, budget=budget, ok=measurement["error"] is None and measurement["seconds"] <= budget and not unexpected, unexpected=unexpected, **measurement))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m scripts.import_benchmark", description="Temps d'import à froid des modules d'entrée")
+    parser.add_argument("modules", nargs="*", help="modules mesurés (par défaut tous les modules d'entrée)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--details", action="store_true", help="affiche les imports les plus longs de chaque module")
+    args = parser.parse_args(argv)
+
+    results = run(args.modules, args.repeat)
+    for result in results:
+        status = "ok" if result["ok"] else "ÉCHEC"
+        print(f"{status:5} {result['module']:40} {result['seconds']:6.2f}s / {result['budget']:.1f}s  {result['rss_mb']:7.1f} Mo  {','.join(result['heavy']) or '-'}")
+        if result["error"]:
+            print(f"      import impossible : {result['error']}")
+        if result["unexpected"]:
+            print(f"      modules lourds non autorisés : {', '.join(result['unexpected'])}")
+        if args.details:
+            for seconds, name in slowest_imports(result["module"]):
+                print(f"      {seconds:6.2f}s  {name}")
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+import pickle
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from h3 import h3
+from scripts.cache import PickleCache, fingerprint
+from scripts.profiling import stage
+
+
+def _fit_auto_arima(hex_id, y_train, X_train, y_test, X_test, params):
+    """
+    Recherche pas à pas des ordres (S)ARIMA(X) d'un hexagone (exécuté dans un processus du pool).
+
+    Returns:
+        tuple: (hex_id, modèle pmdarima ajusté, MAE sur la période de test)
+    """
+    import pmdarima as pm
+    from sklearn.metrics import mean_absolute_error
+
+    model = pm.auto_arima(y_train, X=X_train, stepwise=True, suppress_warnings=True, error_action="ignore", **params)
+    predictions = model.predict(n_periods=len(y_test), X=X_test)
+    return hex_id, model, mean_absolute_error(y_test, predictions)
+
+
+class AutoARIMAModel:
+    """
+    Classe AutoARIMAModel pour l'entraînement de vrais modèles (S)ARIMA(X) par hexagone avec pmdarima.auto_arima.
+
+    Les recherches d'ordres sont lancées dans un pool de processus par vagues : une première vague de hexagones
+    deux à deux non voisins, puis les hexagones dont au moins un voisin H3 est déjà ajusté. La recherche pas à pas
+    d'un hexagone part alors des ordres médians de ses voisins, reprend leurs ordres de différenciation (ce qui évite
+    les tests de différenciation) et borne les ordres AR/MA au voisinage de ceux des voisins.
+    Les modèles ajustés (résultats espace d'état) sont mis en cache sur disque : une nouvelle prévision ne réajuste rien.
+
+    Attributs:
+        y (str): Nom de la variable cible
+        exogenous (list): Variables exogènes (None : modèle sans exogènes)
+        seasonal (bool): Recherche d'une composante saisonnière
+        m (int): Période saisonnière (7 : hebdomadaire sur données journalières)
+        max_order (tuple): Ordres maximaux (p, d, q)
+        max_seasonal_order (tuple): Ordres saisonniers maximaux (P, D, Q)
+        information_criterion (str): Critère d'information utilisé par la recherche pas à pas
+        n_jobs (int): Nombre de processus du pool (None : nombre de CPU)
+        horizon (int): Nombre de derniers jours réservés à l'évaluation
+        cache (PickleCache): Cache disque des modèles ajustés
+        arima_models (dict): Modèles ajustés par hexagone
+        arima_orders (dict): Ordres (order, seasonal_order) retenus par hexagone
+        arima_models_mae (dict): MAE de chaque modèle sur les derniers jours
+
+    Methods:
+        neighbors: Renvoie les voisins H3 directs d'un hexagone
+        schedule: Découpe les hexagones en vagues successives
+        warm_start: Paramètres de recherche d'un hexagone à partir des ordres de ses voisins ajustés
+        run: Entraîne un modèle par hexagone
+        forecast: Prévoit à partir du modèle (en mémoire ou en cache) d'un hexagone
+        save_model
+    """
+
+    def __init__(self, y="precip_mean", exogenous=None, seasonal=True, m=7, max_order=(5, 2, 5), max_seasonal_order=(2, 1, 2),
+                 information_criterion="aic", n_jobs=None, horizon=7, cache_dir="models/auto_arima"):
+        self.y = y
+        self.exogenous = exogenous
+        self.seasonal = seasonal
+        self.m = m
+        self.max_order = max_order
+        self.max_seasonal_order = max_seasonal_order
+        self.information_criterion = information_criterion
+        self.n_jobs = n_jobs
+        self.horizon = horizon
+        self.cache = PickleCache(cache_dir)
+        self.arima_models = {}
+        self.arima_orders = {}
+        self.arima_models_mae = {}
+
+    @staticmethod
+    def neighbors(hex_id):
+        return set(h3.k_ring(hex_id, 1)) - {hex_id}
+
+    def schedule(self, hexagones):
+        """
+        Découpe les hexagones en vagues : chaque vague ne contient que des hexagones ayant au moins un voisin
+        dans les vagues précédentes (sauf la première vague de chaque composante, formée d'hexagones non voisins).
+
+        Parameters:
+            hexagones (list): Liste des hexagones
+
+        Returns:
+            list: Liste de vagues (listes d'hexagones)
+        """
+        remaining = sorted(set(hexagones))
+        scheduled = set()
+        waves = []
+        while remaining:
+            wave = [hex_id for hex_id in remaining if self.neighbors(hex_id) & scheduled]
+            if not wave:
+                for hex_id in remaining:
+                    if not self.neighbors(hex_id) & set(wave):
+                        wave.append(hex_id)
+            waves.append(wave)
+            scheduled.update(wave)
+            remaining = [hex_id for hex_id in remaining if hex_id not in scheduled]
+        return waves
+
+    def _base_params(self):
+        return {
+            "seasonal": self.seasonal, "m": self.m if self.seasonal else 1,
+            "max_p": self.max_order[0], "max_d": self.max_order[1], "max_q": self.max_order[2],
+            "max_P": self.max_seasonal_order[0], "max_D": self.max_seasonal_order[1], "max_Q": self.max_seasonal_order[2],
+            "information_criterion": self.information_criterion,
+        }
+
+    def warm_start(self, hex_id):
+        """
+        Construit les paramètres de auto_arima d'un hexagone à partir des ordres de ses voisins déjà ajustés.
+
+        Parameters:
+            hex_id (str): Hexagone considéré
+
+        Returns:
+            dict: Paramètres de pmdarima.auto_arima
+        """
+        params = self._base_params()
+        orders = [self.arima_orders[neighbor] for neighbor in self.neighbors(hex_id) if neighbor in self.arima_orders]
+        if not orders:
+            return params
+
+        orders = np.array([tuple(order) + tuple(seasonal_order[:3]) for order, seasonal_order in orders])
+        p, d, q, P, D, Q = orders.T
+        params.update({
+            "start_p": int(np.median(p)), "start_q": int(np.median(q)),
+            "max_p": int(min(p.max() + 1, self.max_order[0])), "max_q": int(min(q.max() + 1, self.max_order[2])),
+            "d": int(Counter(d).most_common(1)[0][0]),
+        })
+        if self.seasonal:
+            params.update({
+                "start_P": int(np.median(P)), "start_Q": int(np.median(Q)),
+                "max_P": int(min(P.max() + 1, self.max_seasonal_order[0])), "max_Q": int(min(Q.max() + 1, self.max_seasonal_order[2])),
+                "D": int(Counter(D).most_common(1)[0][0]),
+            })
+        return params
+
+    def _split(self, data_hex):
+        data_hex = data_hex.sort_values("date")
+        end_train_date = data_hex["date"].max() + pd.DateOffset(days=-self.horizon)
+        train, test = data_hex[data_hex["date"] <= end_train_date], data_hex[data_hex["date"] > end_train_date]
+        X_train = train[self.exogenous].to_numpy(dtype=float) if self.exogenous else None
+        X_test = test[self.exogenous].to_numpy(dtype=float) if self.exogenous else None
+        return train[self.y].to_numpy(dtype=float), X_train, test[self.y].to_numpy(dtype=float), X_test
+
+    def _store(self, hex_id, model, mae):
+        self.arima_models[hex_id] = model
+        self.arima_orders[hex_id] = (model.order, model.seasonal_order)
+        self.arima_models_mae[hex_id] = mae
+
+    def run(self, data_for_arima, hexagones):
+        """
+        Entraîne un modèle (S)ARIMA(X) par hexagone, vague par vague, en réutilisant les modèles en cache.
+
+        Parameters:
+            data_for_arima (DataFrame): Données journalières contenant h3_hex_id, date, la cible et les exogènes
+            hexagones (list): Liste des hexagones
+
+        Returns:
+            dict: Ordres (order, seasonal_order) retenus pour chaque hexagone
+        """
+        samples = {hex_id: sample for hex_id, sample in data_for_arima[data_for_arima["h3_hex_id"].isin(hexagones)].groupby("h3_hex_id")}
+        self.cache_keys = {}
+        with ProcessPoolExecutor(self.n_jobs) as executor:
+            for wave in self.schedule(samples):
+                with stage("auto_arima.wave", rows_in=sum(len(samples[hex_id]) for hex_id in wave), n_hex=len(wave)) as step:
+                    futures = []
+                    for hex_id in wave:
+                        y_train, X_train, y_test, X_test = self._split(samples[hex_id])
+                        # la MAE en cache dépend de la période de test, et le modèle retenu du point de départ de la recherche
+                        params = self.warm_start(hex_id)
+                        key = fingerprint(hex_id, y_train, X_train if X_train is not None else [], y_test, X_test if X_test is not None else [], params, self.exogenous)
+                        self.cache_keys[hex_id] = key
+                        cached = self.cache.get(key)
+                        if cached is not None:
+                            self._store(hex_id, *cached)
+                        else:
+                            futures.append(executor.submit(_fit_auto_arima, hex_id, y_train, X_train, y_test, X_test, params))
+                    for future in as_completed(futures):
+                        hex_id, model, mae = future.result()
+                        self.cache.set(self.cache_keys[hex_id], (model, mae))
+                        self._store(hex_id, model, mae)
+                    step.args["fitted"] = len(futures)
+        return self.arima_orders
+
+    def forecast(self, hex_id, n_periods=7, X=None, return_conf_int=False, alpha=0.05):
+        """
+        Prévoit les n_periods jours suivant la fin d'entraînement d'un hexagone sans réajustement.
+
+        Parameters:
+            hex_id (str): Hexagone considéré
+            n_periods (int): Horizon de prévision
+            X (array, optional): Valeurs des exogènes sur l'horizon
+            return_conf_int (bool): Renvoie aussi les intervalles de prévision
+            alpha (float): Niveau des intervalles
+
+        Returns:
+            np.ndarray (ou tuple avec les intervalles): Prévisions
+        """
+        model = self.arima_models.get(hex_id)
+        if model is None and hex_id in getattr(self, "cache_keys", {}):
+            model = self.cache.get(self.cache_keys[hex_id], (None, None))[0]
+        if model is None:
+            raise KeyError(f"Aucun modèle ajusté pour l'hexagone {hex_id}")
+        return model.predict(n_periods=n_periods, X=X, return_conf_int=return_conf_int, alpha=alpha)
+
+    def save_model(self, filename='auto_arima_models.pkl'):
+        """
+        Sauvegarde les modèles ajustés de chaque hexagone dans un fichier pickle.
+
+        Parameters:
+            filename (str): le nom du fichier dans lequel sauvegarder les modèles.
+
+        Returns:
+            None
+        """
+        with open(filename, 'wb') as file:
+            pickle.dump(self.arima_models, file)
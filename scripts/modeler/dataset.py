@@ -1,5 +1,7 @@
 import random
 import pandas as pd
+from scripts.processor.partition import HexPartitionedData
+from scripts.profiling import stage
 
 class MLDataSet:
     """
@@ -9,9 +11,12 @@ class MLDataSet:
         data_for_arima (pd.DataFrame) : Données pour le modèle ARIMA.
         instances (int) : Nombre d'instances de données.
         y (pd.Series) : Valeurs cibles pour les séries temporelles.
+        hex_id (str) : Hexagone à extraire lorsque data est une HexPartitionedData.
     """
 
-    def __init__(self, data, instances, y):
+    def __init__(self, data, instances, y, hex_id=None):
+        if isinstance(data, HexPartitionedData):
+            data = data.get(hex_id)
         self.data = data
         self.instances = instances
         self.y = y
@@ -24,15 +29,17 @@ class MLDataSet:
             train (pd.DataFrame) : Données d'entraînement.
             test (pd.DataFrame) : Données de test.
         """
-        data_for_arima_sample = self.data
-        data_for_arima_sample = data_for_arima_sample.drop(columns=["h3_hex_id"])
-        
-        self.end_train_index = data_for_arima_sample[data_for_arima_sample['date'] == (data_for_arima_sample['date'].max() + pd.DateOffset(days=-7))].index[0]
-        self.end_test_index = data_for_arima_sample.index[-1]
-        self.X = data_for_arima_sample[self.instances]
-        self.y = data_for_arima_sample[self.y]
-        self.X_train, self.X_test,self.y_train,self.y_test = self.train_test_split(self.X,self.y, end_train_index=self.end_train_index)
-        
+        with stage("dataset.prepare_data", rows_in=len(self.data)) as step:
+            data_for_arima_sample = self.data
+            data_for_arima_sample = data_for_arima_sample.drop(columns=["h3_hex_id"])
+
+            self.end_train_index = data_for_arima_sample[data_for_arima_sample['date'] == (data_for_arima_sample['date'].max() + pd.DateOffset(days=-7))].index[0]
+            self.end_test_index = data_for_arima_sample.index[-1]
+            self.X = data_for_arima_sample[self.instances]
+            self.y = data_for_arima_sample[self.y]
+            self.X_train, self.X_test,self.y_train,self.y_test = self.train_test_split(self.X,self.y, end_train_index=self.end_train_index)
+            step.rows_out = len(self.X_train) + len(self.X_test)
+
         return self.X_train, self.X_test,self.y_train,self.y_test
 
     def train_test_split(self, X,y=None, end_train_index=0.2):
@@ -1,10 +1,9 @@
-import plotly.graph_objects as go
+import os
 import numpy as np
 import pandas as pd
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense, Flatten
-import plotly.graph_objects as go
-from sklearn.metrics import mean_absolute_error
+from scripts.processor.cube import HexTimeCube
+from scripts.processor.partition import HexPartitionedData
+from scripts.profiling import stage
 
 class LSTMModel:
     """
@@ -26,10 +25,13 @@ class LSTMModel:
     train_test_split: Divise les données en ensembles d'entraînement et de test.
     create_model: Crée l'architecture du modèle LSTM.
     train: Entraîne le modèle LSTM sur les données d'entraînement.
+    resume_training: Poursuit l'entraînement du modèle courant jusqu'à un nombre d'epochs donné.
     predict_OOS: Prédit les valeurs de la colonne cible en utilisant la prévision dynamique (out-of-sample).
     evaluate: Évalue les performances du modèle en utilisant l'erreur absolue moyenne (MAE).
     plot_results: Affiche un graphique des valeurs réelles et prédites.
-    run: Crée et entraîne des modèles LSTM pour chaque hexagone dans une liste donnée, en utilisant les données de séries chronologiques fournies.
+    run: Crée et entraîne des modèles LSTM pour chaque hexagone dans une liste donnée, en utilisant les données de séries chronologiques fournies (DataFrame, HexPartitionedData ou HexTimeCube journalier).
+    prepare_hex_splits: Prépare les ensembles d'entraînement, de validation et de test d'un hexagone.
+    predict_probabilistic: Prévisions probabilistes (quantiles, probabilités de dépassement) par simulation Monte-Carlo.
     save_models
     """
 
@@ -62,6 +64,9 @@ class LSTMModel:
             return X_train, X_test
 
     def create_model(self, num_features, units=64, activation='relu', loss="mse", optimizer="adam"):
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import LSTM, Dense, Flatten
+
         model = Sequential()
         model.add(LSTM(units=units, activation=activation, input_shape=(self.time_steps, num_features)))
         model.add(Flatten())
@@ -73,6 +78,9 @@ class LSTMModel:
         self.model = self.create_model(X_train.shape[2], units, activation, loss, optimizer)
         self.model.fit(X_train, y_train, validation_data=(X_valid,y_valid), epochs=epochs, verbose=verbose)
 
+    def resume_training(self, X_train, y_train, X_valid, y_valid, initial_epoch, epochs, verbose=0):
+        self.model.fit(X_train, y_train, validation_data=(X_valid,y_valid), initial_epoch=initial_epoch, epochs=epochs, verbose=verbose)
+
     def predict_OOS(self,X_test):
         Y_pred = []
         for i in range(len(X_test)):
@@ -86,55 +94,77 @@ class LSTMModel:
     
 
     def evaluate(self, y_true, y_pred):
+        from sklearn.metrics import mean_absolute_error
+
         mae = mean_absolute_error(y_true, y_pred)
         return mae
     
     
-    def plot_results(self, y_true, y_pred, title, xaxis_title='Jours', yaxis_title='Pluviométrie'):
-
-        mae = self.evaluate(y_true, y_pred)
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(y=y_true, mode='lines', name='True Values', line=dict(color='red')))
-        fig.add_trace(go.Scatter(y=y_pred, mode='lines', name='Predicted Values', line=dict(color='blue')))
-
-        fig.update_layout(
-            xaxis_title=xaxis_title,
-            yaxis_title=yaxis_title,
-            title=title,
-        )
-        fig.add_annotation(
-            x=0.5,
-            y=1.05,
-            xref='paper',
-            yref='paper',
-            text="Mean Absolute Error: {:.4f}".format(mae),
-            showarrow=False,
-            font=dict(size=14)
-        )
-        fig.show()    
+    def plot_results(self, y_true, y_pred, title, xaxis_title='Jours', yaxis_title='Pluviométrie', n_points=2000, interactive=False):
+        from scripts.plotter.forecast import plot_forecast
+
+        plot_forecast(y_true, y_pred, self.evaluate(y_true, y_pred), title, xaxis_title, yaxis_title, n_points, interactive)
         
-    def run(self, data_for_deep, hexagones, units=64, activation='relu', loss="mse", optimizer="adam", epochs=50):
+    def run(self, data_for_deep, hexagones, units=64, activation='relu', loss="mse", optimizer="adam", epochs=50, time_steps=7):
         self.lstm_models = {}
         self.lstm_models_mae = {}
-        data = data_for_deep.copy()
+        self.lstm_forecasts = {}
+        if isinstance(data_for_deep, HexTimeCube):
+            data_for_deep = data_for_deep.to_frame(hexagones)
+        if not isinstance(data_for_deep, HexPartitionedData):
+            data_for_deep = HexPartitionedData(data_for_deep)
         for chosen_hex_id in hexagones:
-            single_data=data_for_deep[data_for_deep["h3_hex_id"]==chosen_hex_id]
-            single_data.drop(columns=["h3_hex_id"], inplace=True)
-            single_data.set_index("date", inplace=True)
-            target_column = 'precip_mean'
-            time_steps = 7
-            lstm_model = LSTMModel(single_data, target_column, time_steps)
-            X, y = lstm_model.prepare_data()
-            end_train_date = single_data.index.max() + pd.DateOffset(days=-7)
-            end_train_index = single_data[single_data.index <= end_train_date].shape[0]-7
-            X_train, X_test, y_train, y_test = lstm_model.train_test_split(X, y, end_train_index)
-            X_train, X_valid, y_train, y_valid = lstm_model.train_test_split(X_train, y_train, 0.8)
-            lstm_model.train(X_train, y_train, X_valid, y_valid, epochs=epochs, units=units, activation=activation, loss=loss, optimizer=optimizer)
-            predicted_data = lstm_model.predict_OOS(X_test)
+            single_data = data_for_deep.get(chosen_hex_id)
+            with stage("lstm.train_hex", rows_in=len(single_data), hex_id=chosen_hex_id):
+                lstm_model, X_train, X_valid, X_test, y_train, y_valid, y_test = LSTMModel.prepare_hex_splits(single_data, time_steps)
+                lstm_model.train(X_train, y_train, X_valid, y_valid, epochs=epochs, units=units, activation=activation, loss=loss, optimizer=optimizer)
+                predictions = lstm_model.predict_OOS(X_test)
             self.lstm_models[chosen_hex_id] = lstm_model.model
             self.lstm_models_mae[chosen_hex_id] = lstm_model.evaluate(y_test, predictions)
-            return self.lstm_models
+            self.lstm_forecasts[chosen_hex_id] = pd.Series(predictions, index=y_test.index)
+        return self.lstm_models
+
+    @staticmethod
+    def prepare_hex_splits(single_data, time_steps=7, target_column='precip_mean'):
+        """
+        Prépare les ensembles d'entraînement, de validation et de test (7 derniers jours) d'un hexagone.
+
+        Parameters:
+            single_data (DataFrame): les données d'un seul hexagone (avec les colonnes h3_hex_id et date).
+            time_steps (int): le nombre de pas de temps en entrée du LSTM.
+            target_column (str): la colonne cible.
+
+        Returns:
+            tuple: (lstm_model, X_train, X_valid, X_test, y_train, y_valid, y_test)
+        """
+        single_data = single_data.drop(columns=["h3_hex_id"]).set_index("date")
+        lstm_model = LSTMModel(single_data, target_column, time_steps)
+        X, y = lstm_model.prepare_data()
+        end_train_date = single_data.index.max() + pd.DateOffset(days=-7)
+        end_train_index = single_data[single_data.index <= end_train_date].shape[0]-time_steps
+        X_train, X_test, y_train, y_test = lstm_model.train_test_split(X, y, end_train_index)
+        X_train, X_valid, y_train, y_valid = lstm_model.train_test_split(X_train, y_train, 0.8)
+        return lstm_model, X_train, X_valid, X_test, y_train, y_valid, y_test
         
+    def predict_probabilistic(self, data_for_deep, hexagones=None, time_steps=7, n_paths=500, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), thresholds=(0.1, 1.0), random_state=0):
+        """
+        Prévisions probabilistes des 7 jours hors échantillon des modèles formés par run, par ré-échantillonnage des résidus
+        (cf LSTMResidualBootstrapForecaster : les trajectoires d'un hexagone passent par lots dans model.predict).
+
+        Parameters:
+            data_for_deep (DataFrame, HexPartitionedData ou HexTimeCube journalier): les données utilisées par run.
+            hexagones (list, optional): les hexagones (par défaut tous ceux de lstm_models).
+            time_steps (int): le nombre de pas de temps utilisé par run.
+            n_paths (int): le nombre de trajectoires simulées par hexagone.
+
+        Returns:
+            pd.DataFrame: une ligne par hexagone et jour (h3_hex_id, date, step, mean, q<niveau>..., p_gt_<seuil>...)
+        """
+        from scripts.modeler.probabilistic import LSTMResidualBootstrapForecaster
+
+        forecaster = LSTMResidualBootstrapForecaster(n_paths, quantiles=quantiles, thresholds=thresholds, random_state=random_state, time_steps=time_steps)
+        return forecaster.run(data_for_deep, self.lstm_models, hexagones)
+
     def save_models(self, directory='models/lstm_models'):
         """
         Saves the trained LSTM models for each hexagon in a specified directory.
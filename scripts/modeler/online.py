@@ -0,0 +1,243 @@
+import pickle
+import numpy as np
+import pandas as pd
+from scripts.modeler.sarimax import SARIMAXCustomModel
+from scripts.profiling import stage
+
+class RLSOnlineUpdater:
+    """
+    Classe RLSOnlineUpdater pour la mise à jour en ligne des modèles linéaires par hexagone (SARIMAXCustomModel) par moindres carrés récursifs (RLS).
+    Les coefficients de tous les hexagones sont empilés dans un même tableau sur l'union des colonnes ('const' + instances) :
+    les colonnes écartées par la sélection pas à pas restent figées à zéro. Une mise à jour coûte O(p²) par hexagone et par jour
+    et est vectorisée sur l'ensemble des hexagones. Un contrôle de dérive périodique déclenche un réajustement complet
+    (avec nouvelle sélection des variables) uniquement pour les hexagones qui en ont besoin.
+
+    Attributs:
+        instances (list): Liste des variables explicatives (cf FeaturesConstructor.instances)
+        y (str): Nom de la variable cible
+        forgetting_factor (float): Facteur d'oubli lambda (1 : pas d'oubli, 0.98-0.999 pour suivre une dérive)
+        threshold (float): Seuil de signification utilisé lors des (ré)ajustements complets
+        drift_window (int): Nombre de jours utilisés pour estimer l'erreur récente de chaque hexagone
+        drift_ratio (float): Ratio MAE récente / MAE d'ajustement au-delà duquel un hexagone est réajusté
+        check_every (int): Périodicité (en jours) du contrôle de dérive dans run
+        delta (float): Variance a priori des coefficients non identifiés par l'historique d'ajustement
+        hexagones (list): Hexagones suivis
+        columns (list): Colonnes de l'espace commun des coefficients
+        theta (np.ndarray): Coefficients (n_hex, p)
+        P (np.ndarray): Inverses des matrices de covariance (n_hex, p, p)
+        mask (np.ndarray): Colonnes actives pour chaque hexagone (n_hex, p)
+
+    Methods:
+        initialize: Ajuste (ou reprend) les modèles de chaque hexagone et initialise l'état RLS
+        refit: Réajuste complètement une liste d'hexagones (sélection des variables comprise)
+        update: Met à jour tous les hexagones avec une nouvelle observation (vectorisé)
+        update_from_frame: Met à jour à partir des lignes d'une journée
+        predict: Prédit la cible pour une ligne par hexagone
+        check_drift: Renvoie les hexagones dont l'erreur récente a dérivé
+        run: Rejoue les données jour par jour à partir d'une date donnée
+        get_models: Renvoie les coefficients au format de SARIMAXCustomModel.sarimax_models
+        save_model
+    """
+
+    def __init__(self, instances, y="precip_mean", forgetting_factor=1.0, threshold=0.1, drift_window=30, drift_ratio=1.5, check_every=7, delta=1e4):
+        if not 0 < forgetting_factor <= 1:
+            raise ValueError("forgetting_factor doit être dans ]0, 1]")
+        self.instances = sorted(instances)
+        self.y = y
+        self.forgetting_factor = forgetting_factor
+        self.threshold = threshold
+        self.drift_window = drift_window
+        self.drift_ratio = drift_ratio
+        self.check_every = check_every
+        self.delta = delta
+        self.columns = ["const"] + self.instances
+
+    def _design(self, X):
+        """
+        Construit la matrice de design (n, p) dans l'ordre de self.columns.
+        """
+        X = X[self.instances].to_numpy(dtype=float)
+        return np.column_stack([np.ones(len(X)), X])
+
+    def _set_hex_state(self, i, X, y, params):
+        """
+        Initialise l'état RLS de l'hexagone i à partir des paramètres OLS et des données ayant servi à l'ajustement.
+        """
+        active = np.isin(self.columns, list(params.index))
+        design = self._design(X)[:, active]
+        self.theta[i] = 0.0
+        self.theta[i, active] = params.reindex(np.array(self.columns)[active]).to_numpy()
+        # Les directions non observées (ex: indicatrice d'un mois absent de l'historique) reçoivent un a priori diffus
+        gram = design.T @ design
+        gram_pinv = np.linalg.pinv(gram)
+        self.P[i] = 0.0
+        self.P[i][np.ix_(active, active)] = gram_pinv + self.delta * (np.eye(len(gram)) - gram_pinv @ gram)
+        self.mask[i] = active
+        self.fit_mae[i] = np.mean(np.abs(y.to_numpy() - design @ self.theta[i, active]))
+        self.errors[i] = np.nan
+
+    def _fit_hex(self, sample):
+        X, y = sample[self.instances], sample[self.y]
+        model = SARIMAXCustomModel()
+        model.train(X, y, threshold=self.threshold)
+        return X, y, model.model.params
+
+    def initialize(self, data, hexagones, sarimax_models=None):
+        """
+        Ajuste les modèles de chaque hexagone et initialise l'état RLS.
+
+        Parameters:
+            data (DataFrame): Données journalières (sortie de FeaturesConstructor.run) servant à l'ajustement initial
+            hexagones (list): Liste des hexagones à suivre
+            sarimax_models (dict, optional): Paramètres déjà entraînés (SARIMAXCustomModel.sarimax_models) ; la sélection des variables n'est alors pas refaite
+        """
+        self.hexagones = list(hexagones)
+        self.hex_index = {hex_id: i for i, hex_id in enumerate(self.hexagones)}
+        n_hex, p = len(self.hexagones), len(self.columns)
+        self.theta = np.zeros((n_hex, p))
+        self.P = np.zeros((n_hex, p, p))
+        self.mask = np.zeros((n_hex, p), dtype=bool)
+        self.fit_mae = np.full(n_hex, np.nan)
+        self.errors = np.full((n_hex, self.drift_window), np.nan)
+        self.n_updates = 0
+
+        for hex_id, sample in data[data["h3_hex_id"].isin(self.hexagones)].groupby("h3_hex_id"):
+            if sarimax_models is not None and hex_id in sarimax_models:
+                X, y, params = sample[self.instances], sample[self.y], sarimax_models[hex_id]
+            else:
+                X, y, params = self._fit_hex(sample)
+            self._set_hex_state(self.hex_index[hex_id], X, y, params)
+
+    def refit(self, data, hexagones):
+        """
+        Réajuste complètement (sélection des variables comprise) les hexagones donnés sur l'historique fourni.
+
+        Parameters:
+            data (DataFrame): Historique disponible pour le réajustement
+            hexagones (list): Hexagones à réajuster
+        """
+        for hex_id, sample in data[data["h3_hex_id"].isin(hexagones)].groupby("h3_hex_id"):
+            X, y, params = self._fit_hex(sample)
+            self._set_hex_state(self.hex_index[hex_id], X, y, params)
+
+    def predict(self, X):
+        """
+        Prédit la cible pour une ligne de design par hexagone.
+
+        Parameters:
+            X (np.ndarray): Matrice de design (n_hex, p) dans l'ordre de self.columns
+
+        Returns:
+            np.ndarray: Prédictions (n_hex,)
+        """
+        return np.einsum("np,np->n", self.theta, np.where(self.mask, X, 0.0))
+
+    def update(self, X, y):
+        """
+        Met à jour les coefficients de tous les hexagones avec une nouvelle observation (une étape RLS vectorisée).
+        Les hexagones dont l'observation est manquante (NaN) sont laissés inchangés.
+
+        Parameters:
+            X (np.ndarray): Matrice de design (n_hex, p) dans l'ordre de self.columns
+            y (np.ndarray): Observations de la cible (n_hex,)
+
+        Returns:
+            np.ndarray: Erreurs de prédiction a priori (n_hex,)
+        """
+        lam = self.forgetting_factor
+        x = np.where(self.mask, X, 0.0)
+        valid = ~np.isnan(y) & ~np.isnan(x).any(axis=1)
+        x = np.nan_to_num(x)
+
+        Px = np.einsum("nij,nj->ni", self.P, x)
+        gain = Px / (lam + np.einsum("ni,ni->n", x, Px))[:, None]
+        error = np.where(valid, y - np.einsum("ni,ni->n", self.theta, x), np.nan)
+
+        theta = self.theta + gain * np.nan_to_num(error)[:, None]
+        P = (self.P - np.einsum("ni,nj->nij", gain, Px)) / lam
+        P = (P + P.transpose(0, 2, 1)) / 2
+        self.theta = np.where(valid[:, None], theta, self.theta)
+        self.P = np.where(valid[:, None, None], P, self.P)
+
+        self.errors[:, self.n_updates % self.drift_window] = error
+        self.n_updates += 1
+        return error
+
+    def update_from_frame(self, day_data):
+        """
+        Met à jour tous les hexagones à partir des lignes d'une journée (une ligne par hexagone).
+
+        Parameters:
+            day_data (DataFrame): Lignes d'une même date contenant h3_hex_id, les instances et la cible
+
+        Returns:
+            pd.Series: Erreurs de prédiction a priori par hexagone
+        """
+        day_data = day_data.set_index("h3_hex_id").reindex(self.hexagones)
+        error = self.update(self._design(day_data), day_data[self.y].to_numpy(dtype=float))
+        return pd.Series(error, index=self.hexagones)
+
+    def check_drift(self):
+        """
+        Compare l'erreur absolue moyenne récente de chaque hexagone à celle de son dernier ajustement.
+
+        Returns:
+            list: Hexagones dont la MAE récente dépasse drift_ratio fois la MAE d'ajustement
+        """
+        counts = np.sum(~np.isnan(self.errors), axis=1)
+        recent_mae = np.nansum(np.abs(self.errors), axis=1) / np.maximum(counts, 1)
+        drifting = (counts >= self.drift_window // 2) & (recent_mae > self.drift_ratio * self.fit_mae)
+        return [self.hexagones[i] for i in np.flatnonzero(drifting)]
+
+    def run(self, data, hexagones, start_date, sarimax_models=None):
+        """
+        Ajuste les modèles sur les données antérieures à start_date, puis les met à jour jour par jour,
+        avec un contrôle de dérive tous les check_every jours.
+
+        Parameters:
+            data (DataFrame): Données journalières (sortie de FeaturesConstructor.run)
+            hexagones (list): Liste des hexagones à suivre
+            start_date (str ou Timestamp): Première date traitée en ligne
+            sarimax_models (dict, optional): Paramètres déjà entraînés pour l'ajustement initial
+
+        Returns:
+            dict: Coefficients finaux de chaque hexagone
+        """
+        start_date = pd.Timestamp(start_date)
+        with stage("online.initialize", n_hex=len(hexagones)):
+            self.initialize(data[data["date"] < start_date], hexagones, sarimax_models)
+        self.refits = {}
+        online_data = data[(data["date"] >= start_date) & data["h3_hex_id"].isin(self.hexagones)]
+        for day, (date, day_data) in enumerate(online_data.groupby("date"), start=1):
+            self.update_from_frame(day_data)
+            if day % self.check_every == 0:
+                drifting = self.check_drift()
+                if drifting:
+                    with stage("online.refit", n_hex=len(drifting)):
+                        self.refit(data[data["date"] <= date], drifting)
+                    self.refits[date] = drifting
+        return self.get_models()
+
+    def get_models(self):
+        """
+        Renvoie les coefficients courants au même format que SARIMAXCustomModel.sarimax_models.
+
+        Returns:
+            dict: un dictionnaire {hexagone: pd.Series des coefficients actifs}
+        """
+        columns = np.array(self.columns)
+        return {hex_id: pd.Series(self.theta[i, self.mask[i]], index=columns[self.mask[i]]) for i, hex_id in enumerate(self.hexagones)}
+
+    def save_model(self, filename='rls_models.pkl'):
+        """
+        Sauvegarde l'état RLS complet (coefficients, matrices P, masques) dans un fichier pickle.
+
+        Parameters:
+            filename (str): le nom du fichier dans lequel sauvegarder l'état.
+
+        Returns:
+            None
+        """
+        state = {"hexagones": self.hexagones, "columns": self.columns, "theta": self.theta, "P": self.P, "mask": self.mask, "fit_mae": self.fit_mae, "forgetting_factor": self.forgetting_factor}
+        with open(filename, 'wb') as file:
+            pickle.dump(state, file)
@@ -0,0 +1,242 @@
+import re
+import warnings
+import numpy as np
+import pandas as pd
+from scripts.modeler.dataset import MLDataSet
+from scripts.processor.cube import HexTimeCube
+from scripts.processor.partition import HexPartitionedData
+from scripts.profiling import stage
+
+
+def summarize_paths(paths, quantiles, thresholds):
+    """
+    Résume des trajectoires simulées par des quantiles et des probabilités de dépassement.
+
+    Parameters:
+        paths (np.ndarray): trajectoires (n_hex, n_paths, horizon)
+        quantiles (tuple): niveaux des quantiles
+        thresholds (tuple): seuils de précipitation
+
+    Returns:
+        dict: {'mean': (n_hex, horizon), 'q<niveau>': (n_hex, horizon), 'p_gt_<seuil>': (n_hex, horizon)}
+    """
+    summary = {"mean": paths.mean(axis=1)}
+    for level, values in zip(quantiles, np.quantile(paths, quantiles, axis=1)):
+        summary[f"q{level:g}"] = values
+    for threshold in thresholds:
+        summary[f"p_gt_{threshold:g}"] = (paths > threshold).mean(axis=1)
+    return summary
+
+
+class ResidualBootstrapForecaster:
+    """
+    Classe ResidualBootstrapForecaster : prévisions probabilistes des modèles linéaires par hexagone (SARIMAXCustomModel)
+    par simulation Monte-Carlo de trajectoires récursives avec ré-échantillonnage des résidus d'ajustement.
+
+    Comme dans RLSOnlineUpdater, les coefficients de tous les hexagones sont empilés sur l'union des colonnes ('const' +
+    instances, zéro pour les variables écartées). Sur l'horizon (les 7 jours de test de MLDataSet), les variables autres
+    que les retards de la cible sont prises telles quelles ; leur contribution est calculée une fois par hexagone et par jour.
+    Les trajectoires (n_hex, n_paths, horizon) sont ensuite simulées pas de temps par pas de temps, chaque pas étant une
+    seule opération vectorisée sur tous les hexagones et toutes les trajectoires :
+        y[t] = max(0, contribution[t] + somme_k phi_k * y[t-k] + résidu tiré au hasard),
+    où y[t-k] est la valeur observée lorsque t-k précède l'horizon, la valeur simulée sinon. Les précipitations négatives
+    sont ramenées à zéro et c'est la valeur ramenée qui alimente les retards suivants.
+    Les hexagones sont traités par blocs pour borner la mémoire.
+
+    Attributs:
+        n_paths (int): Nombre de trajectoires par hexagone
+        horizon (int): Nombre de jours simulés
+        quantiles (tuple): Niveaux des quantiles renvoyés
+        thresholds (tuple): Seuils des probabilités P(précipitation > seuil) renvoyées
+        y (str): Nom de la variable cible
+        random_state (int): Graine du générateur aléatoire
+        block_size (int): Nombre d'hexagones simulés simultanément
+        hexagones (list): Hexagones préparés par fit
+        dates (np.ndarray): Dates de l'horizon de chaque hexagone (n_hex, horizon)
+
+    Methods:
+        fit(data, sarimax_models, hexagones): Prépare contributions, coefficients des retards, historiques et résidus
+        simulate(hex_slice): Simule les trajectoires d'un bloc d'hexagones
+        run(data, sarimax_models, hexagones): fit puis simulation et résumé de tous les hexagones
+    """
+
+    def __init__(self, n_paths=2000, horizon=7, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), thresholds=(0.1, 1.0), y="precip_mean", random_state=0, block_size=256):
+        self.n_paths = n_paths
+        self.horizon = horizon
+        self.quantiles = tuple(quantiles)
+        self.thresholds = tuple(thresholds)
+        self.y = y
+        self.random_state = random_state
+        self.block_size = block_size
+
+    def _lag(self, column):
+        match = re.fullmatch(re.escape(self.y) + r"_lag_(\d+)", column)
+        return int(match.group(1)) if match else None
+
+    def fit(self, data, sarimax_models, hexagones=None):
+        """
+        Parameters:
+            data (DataFrame, HexPartitionedData ou HexTimeCube): features journalières (sortie de FeaturesConstructor.run)
+            sarimax_models (dict): coefficients par hexagone (SARIMAXCustomModel.sarimax_models ou RLSOnlineUpdater.get_models)
+            hexagones (list, optional): hexagones traités (par défaut tous ceux de sarimax_models)
+
+        Returns:
+            self
+        """
+        hexagones = list(sarimax_models) if hexagones is None else [hex_id for hex_id in hexagones if hex_id in sarimax_models]
+        if isinstance(data, HexTimeCube):
+            data = data.to_frame(hexagones)
+        if not isinstance(data, HexPartitionedData):
+            data = HexPartitionedData(data)
+        hexagones = [hex_id for hex_id in hexagones if hex_id in data]
+
+        columns = sorted({column for hex_id in hexagones for column in sarimax_models[hex_id].index if column != "const"})
+        lag_columns = [column for column in columns if self._lag(column) is not None]
+        exogenous = [column for column in columns if column not in lag_columns]
+        self.n_lags = max([self._lag(column) for column in lag_columns], default=0)
+        history_columns = [f"{self.y}_lag_{k}" for k in range(1, self.n_lags + 1)]
+
+        self.hexagones, contributions, phi, history, residuals, dates = [], [], [], [], [], []
+        for hex_id in hexagones:
+            params = sarimax_models[hex_id]
+            dataset = MLDataSet(data, [column for column in params.index if column != "const"], self.y, hex_id)
+            X_train, X_test, y_train, y_test = dataset.prepare_data()
+            if len(X_test) < self.horizon:
+                warnings.warn(f"Hexagone {hex_id} ignoré : {len(X_test)} jours de test pour un horizon de {self.horizon}")
+                continue
+            X_test = dataset.data.loc[X_test.index[:self.horizon]]
+            const = params.get("const", 0.0)
+            used = [column for column in exogenous if column in params.index]
+            contributions.append(const + X_test[used].to_numpy(dtype=float) @ params[used].to_numpy(dtype=float))
+            phi.append([params.get(column, 0.0) for column in history_columns])
+            # retards observés au premier jour de l'horizon : y[-k] pour k = 1..n_lags
+            history.append(X_test.iloc[0].reindex(history_columns).to_numpy(dtype=float))
+            fitted = const + X_train.to_numpy(dtype=float) @ params.drop("const", errors="ignore")[X_train.columns].to_numpy(dtype=float)
+            residuals.append(y_train.to_numpy(dtype=float) - fitted)
+            dates.append(pd.to_datetime(X_test["date"]).to_numpy())
+            self.hexagones.append(hex_id)
+
+        n_hex = len(self.hexagones)
+        self.contributions = np.array(contributions).reshape(n_hex, self.horizon)
+        self.phi = np.array(phi, dtype=float).reshape(n_hex, self.n_lags)
+        self.history = np.nan_to_num(np.array(history, dtype=float).reshape(n_hex, self.n_lags))
+        self.n_residuals = np.array([len(values) for values in residuals], dtype=int)
+        self.residuals = np.zeros((n_hex, self.n_residuals.max(initial=1)))
+        for i, values in enumerate(residuals):
+            self.residuals[i, :len(values)] = values
+        self.dates = np.array(dates).reshape(n_hex, self.horizon)
+        return self
+
+    def simulate(self, hex_slice=slice(None), rng=None):
+        """
+        Parameters:
+            hex_slice (slice): bloc d'hexagones simulé (indices dans self.hexagones)
+            rng (np.random.Generator, optional): générateur aléatoire
+
+        Returns:
+            np.ndarray: trajectoires (n_hex_bloc, n_paths, horizon), positives ou nulles
+        """
+        rng = np.random.default_rng(self.random_state) if rng is None else rng
+        contributions, phi, n_residuals = self.contributions[hex_slice], self.phi[hex_slice], self.n_residuals[hex_slice]
+        n_hex = len(contributions)
+        draws = rng.integers(0, n_residuals[:, None, None], size=(n_hex, self.n_paths, self.horizon))
+        shocks = self.residuals[hex_slice][np.arange(n_hex)[:, None, None], draws]
+        lags = np.repeat(self.history[hex_slice][:, None, :], self.n_paths, axis=1)
+        paths = np.empty((n_hex, self.n_paths, self.horizon))
+        for t in range(self.horizon):
+            paths[:, :, t] = np.maximum(contributions[:, None, t] + np.einsum("npk,nk->np", lags, phi) + shocks[:, :, t], 0.0)
+            if self.n_lags:
+                lags[:, :, 1:] = lags[:, :, :-1].copy()
+                lags[:, :, 0] = paths[:, :, t]
+        return paths
+
+    def run(self, data, sarimax_models, hexagones=None):
+        """
+        Returns:
+            pd.DataFrame: une ligne par hexagone et jour de l'horizon : h3_hex_id, date, step, mean, q<niveau>..., p_gt_<seuil>...
+        """
+        with stage("probabilistic.fit", n_hex=len(hexagones or sarimax_models)):
+            self.fit(data, sarimax_models, hexagones)
+        rng = np.random.default_rng(self.random_state)
+        summaries = []
+        for start in range(0, len(self.hexagones), self.block_size):
+            block = slice(start, start + self.block_size)
+            with stage("probabilistic.simulate", n_hex=len(self.hexagones[block]), n_paths=self.n_paths):
+                summaries.append(summarize_paths(self.simulate(block, rng), self.quantiles, self.thresholds))
+        return self._to_frame(summaries)
+
+    def _to_frame(self, summaries):
+        n_hex = len(self.hexagones)
+        frame = pd.DataFrame({
+            "h3_hex_id": np.repeat(np.array(self.hexagones, dtype=object), self.horizon),
+            "date": self.dates.ravel(),
+            "step": np.tile(np.arange(1, self.horizon + 1), n_hex),
+        })
+        for name in (summaries[0] if summaries else {}):
+            frame[name] = np.concatenate([summary[name] for summary in summaries]).ravel()
+        return frame
+
+
+class LSTMResidualBootstrapForecaster(ResidualBootstrapForecaster):
+    """
+    Variante de ResidualBootstrapForecaster pour les modèles LSTMModel : pour chaque hexagone et chaque jour de l'horizon,
+    les n_paths fenêtres d'entrée (une par trajectoire) passent en un seul lot dans model.predict. La cible simulée aux jours
+    précédents remplace la cible observée dans les fenêtres, et les résidus tirés sont ceux des jours d'entraînement et de
+    validation.
+
+    Attributs supplémentaires:
+        time_steps (int): Nombre de pas de temps en entrée des LSTM (cf LSTMModel.prepare_hex_splits)
+        batch_size (int): Taille des lots passés à model.predict
+    """
+
+    def __init__(self, n_paths=500, horizon=7, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), thresholds=(0.1, 1.0), y="precip_mean", random_state=0, time_steps=7, batch_size=4096):
+        super().__init__(n_paths, horizon, quantiles, thresholds, y, random_state)
+        self.time_steps = time_steps
+        self.batch_size = batch_size
+
+    def run(self, data, lstm_models, hexagones=None):
+        """
+        Parameters:
+            data (DataFrame, HexPartitionedData ou HexTimeCube): données journalières utilisées pour l'entraînement des LSTM
+            lstm_models (dict): modèles Keras par hexagone (LSTMModel.lstm_models)
+            hexagones (list, optional): hexagones traités (par défaut tous ceux de lstm_models)
+
+        Returns:
+            pd.DataFrame: même format que ResidualBootstrapForecaster.run
+        """
+        from scripts.modeler.lstm import LSTMModel
+
+        hexagones = list(lstm_models) if hexagones is None else [hex_id for hex_id in hexagones if hex_id in lstm_models]
+        if isinstance(data, HexTimeCube):
+            data = data.to_frame(hexagones)
+        if not isinstance(data, HexPartitionedData):
+            data = HexPartitionedData(data)
+        rng = np.random.default_rng(self.random_state)
+        self.hexagones, summaries, dates = [], [], []
+        for hex_id in [hex_id for hex_id in hexagones if hex_id in data]:
+            single_data = data.get(hex_id)
+            _, X_train, X_valid, X_test, y_train, y_valid, y_test = LSTMModel.prepare_hex_splits(single_data, self.time_steps, self.y)
+            if len(X_test) < self.horizon:
+                warnings.warn(f"Hexagone {hex_id} ignoré : {len(X_test)} jours de test pour un horizon de {self.horizon}")
+                continue
+            with stage("probabilistic.simulate_lstm", hex_id=hex_id, n_paths=self.n_paths):
+                paths = self._simulate_hex(lstm_models[hex_id], single_data, X_train, X_valid, X_test, y_train, y_valid, rng)
+            summaries.append(summarize_paths(paths[None], self.quantiles, self.thresholds))
+            dates.append(y_test.index[:self.horizon].to_numpy())
+            self.hexagones.append(hex_id)
+        self.dates = np.array(dates).reshape(len(self.hexagones), self.horizon)
+        return self._to_frame(summaries)
+
+    def _simulate_hex(self, model, single_data, X_train, X_valid, X_test, y_train, y_valid, rng):
+        target = list(single_data.drop(columns=["h3_hex_id"]).set_index("date").columns).index(self.y)
+        X_in_sample = np.concatenate([X_train, X_valid]).astype(float)
+        residuals = np.concatenate([y_train, y_valid]).astype(float) - model.predict(X_in_sample, batch_size=self.batch_size, verbose=0).ravel()
+        shocks = residuals[rng.integers(0, len(residuals), size=(self.n_paths, self.horizon))]
+        paths = np.empty((self.n_paths, self.horizon))
+        for t in range(self.horizon):
+            windows = np.repeat(np.asarray(X_test[t], dtype=float)[None], self.n_paths, axis=0)
+            # la fenêtre du jour t se termine la veille : ses j derniers jours cibles sont les valeurs simulées de t-j
+            for j in range(1, min(t, self.time_steps) + 1):
+                windows[:, self.time_steps - j, target] = paths[:, t - j]
+            paths[:, t] = np.maximum(model.predict(windows, batch_size=self.batch_size, verbose=0).ravel() + shocks[:, t], 0.0)
+        return paths
@@ -1,10 +1,10 @@
 import numpy as np
 import pandas as pd
 import pickle
-import statsmodels.api as sm
-import plotly.graph_objects as go
-from sklearn.metrics import mean_absolute_error
 from scripts.modeler.dataset import MLDataSet
+from scripts.processor.cube import HexTimeCube
+from scripts.processor.partition import HexPartitionedData
+from scripts.profiling import stage
 class SARIMAXCustomModel:
     """
     Classe SARIMAXCustomModel pour l'entraînement et la prédiction d'un modèle SARIMAX avec la suppression des variables non significatives.
@@ -14,6 +14,7 @@ class SARIMAXCustomModel:
         sorted_columns : Liste triée des colonnes de caractéristiques
         sarimax_models (dict): un dictionnaire contenant les paramètres des modèles SARIMAX formés pour chaque hexagone.
         sarimax_models_mae (dict): un dictionnaire contenant la MAE (Mean Absolute Error) des prévisions de chaque modèle SARIMAX pour chaque hexagone.
+        sarimax_forecasts (dict): un dictionnaire contenant les prévisions hors échantillon (pd.Series indexée par les dates) de chaque hexagone.
 
     Methods:
         run_ols : Exécute un modèle OLS sur les données fournies.
@@ -22,6 +23,8 @@ class SARIMAXCustomModel:
         evaluate : Évalue le modèle en calculant l'erreur absolue moyenne (Mean Absolute Error - MAE) entre les valeurs réelles et prédites.
         plot_results : Affiche les résultats de prédiction et les valeurs réelles sur un graphique.
         run
+        train_hex : Entraîne et évalue le modèle d'un seul hexagone.
+        predict_probabilistic : Prévisions probabilistes (quantiles, probabilités de dépassement) par simulation Monte-Carlo.
         save_model
     """
 
@@ -41,6 +44,8 @@ class SARIMAXCustomModel:
             model : Modèle OLS entraîné
             sorted_columns : Liste triée des colonnes de caractéristiques
         """
+        import statsmodels.api as sm
+
         sorted_columns = sorted(X.columns)
         X = sm.add_constant(X)
         model = sm.OLS(y, X).fit()
@@ -56,7 +61,7 @@ class SARIMAXCustomModel:
             threshold : Seuil de signification pour la suppression des variables (default : 0.1)
         """
         self.model, self.sorted_columns = self.run_ols(X, y)
-        self.significative_columns = self.sorted_columns[:-1] # exclude target column
+        self.significative_columns = [col for col in self.sorted_columns if col != y.name] # exclude target column
         p_values = self.model.pvalues[1:]
         max_p_value = p_values.max()
         while max_p_value > threshold:
@@ -115,10 +120,12 @@ class SARIMAXCustomModel:
         Returns:
             mae : Erreur absolue moyenne entre les valeurs réelles et prédites
         """
+        from sklearn.metrics import mean_absolute_error
+
         mae = mean_absolute_error(y_true,y_pred)
         return mae
 
-    def plot_results(self, y_true, y_pred, title, xaxis_title='Jours', yaxis_title='Pluviométrie'):
+    def plot_results(self, y_true, y_pred, title, xaxis_title='Jours', yaxis_title='Pluviométrie', n_points=2000, interactive=False):
         """
         Affiche les résultats de prédiction et les valeurs réelles sur un graphique.
 
@@ -128,27 +135,12 @@ class SARIMAXCustomModel:
             title : Titre du graphique
             xaxis_title : Titre de l'axe des abscisses (default : 'Jours')
             yaxis_title : Titre de l'axe des ordonnées (default : 'Pluviométrie')
+            n_points : Nombre de points affichés par courbe, rendu WebGL sous-échantillonné (default : 2000)
+            interactive : Sous-échantillonnage recalculé au zoom (notebook) (default : False)
         """
-        mae = self.evaluate(y_true, y_pred)
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(y=y_true, mode='lines', name='True Values', line=dict(color='red')))
-        fig.add_trace(go.Scatter(y=y_pred, mode='lines', name='Predicted Values', line=dict(color='blue')))
-
-        fig.update_layout(
-            xaxis_title=xaxis_title,
-            yaxis_title=yaxis_title,
-            title=title,
-        )
-        fig.add_annotation(
-            x=0.5,
-            y=1.05,
-            xref='paper',
-            yref='paper',
-            text="Mean Absolute Error: {:.4f}".format(mae),
-            showarrow=False,
-            font=dict(size=14)
-        )
-        fig.show()
+        from scripts.plotter.forecast import plot_forecast
+
+        plot_forecast(y_true, y_pred, self.evaluate(y_true, y_pred), title, xaxis_title, yaxis_title, n_points, interactive)
     
     def run(self, data_for_arima,hexagones):
 
@@ -156,7 +148,7 @@ class SARIMAXCustomModel:
         Forme des modèles SARIMAX personnalisés pour chaque hexagone dans une liste donnée, en utilisant les données de séries chronologiques fournies.
 
         Parameters:
-            data_for_arima (DataFrame): un DataFrame contenant les données de séries chronologiques à utiliser pour l'entraînement des modèles SARIMAX.
+            data_for_arima (DataFrame, HexPartitionedData ou HexTimeCube journalier): les données de séries chronologiques à utiliser pour l'entraînement des modèles SARIMAX (seuls les hexagones demandés sont lus d'un cube).
             hexagones (list): une liste des identifiants uniques des hexagones pour lesquels des modèles doivent être formés.
 
         Returns:
@@ -164,22 +156,63 @@ class SARIMAXCustomModel:
         """
         self.sarimax_models = {}
         self.sarimax_models_mae = {}
+        self.sarimax_forecasts = {}
+
+        if isinstance(data_for_arima, HexTimeCube):
+            data_for_arima = data_for_arima.to_frame(hexagones)
+        if not isinstance(data_for_arima, HexPartitionedData):
+            with stage("sarimax.partition", rows_in=len(data_for_arima)):
+                data_for_arima = HexPartitionedData(data_for_arima)
 
         for hex_fr in hexagones:
-            data_for_arima_sample = data_for_arima[data_for_arima['h3_hex_id'] == hex_fr]
-            y = self.y
-            instances = self.instances
-
-            timeseries_dataset = MLDataSet(data_for_arima_sample, instances, y)
-            X_train, X_test, y_train, y_test = timeseries_dataset.prepare_data()
-            predicted_y_init = y_train.iloc[-1]
-            model = SARIMAXCustomModel()
-            model.train(X_train, y_train)
-            predictions = model.predict_test_OOS(X_test, y_test, predicted_y_init)
+            with stage("sarimax.train_hex", rows_in=len(data_for_arima.get(hex_fr)), hex_id=hex_fr):
+                model, mae = self.train_hex(data_for_arima, hex_fr)
             self.sarimax_models[hex_fr] = model.model.params
-            self.sarimax_models_mae[hex_fr] = model.evaluate(y_test, predictions)
-            return self.sarimax_models
+            self.sarimax_models_mae[hex_fr] = mae
+            self.sarimax_forecasts[hex_fr] = model.forecast
+        return self.sarimax_models
+
+    def train_hex(self, data_for_arima_sample, hex_id=None):
+        """
+        Entraîne et évalue (7 derniers jours hors échantillon) le modèle d'un seul hexagone.
+
+        Parameters:
+            data_for_arima_sample (DataFrame ou HexPartitionedData): les données d'un hexagone, ou une partition dont on extrait hex_id.
+            hex_id (str, optional): l'hexagone à extraire d'une partition.
+
+        Returns:
+            model (SARIMAXCustomModel): le modèle entraîné (prévisions hors échantillon datées dans model.forecast)
+            mae (float): la MAE des prévisions hors échantillon
+        """
+        timeseries_dataset = MLDataSet(data_for_arima_sample, self.instances, self.y, hex_id)
+        X_train, X_test, y_train, y_test = timeseries_dataset.prepare_data()
+        predicted_y_init = y_train.iloc[-1]
+        model = SARIMAXCustomModel()
+        model.train(X_train, y_train)
+        predictions = model.predict_test_OOS(X_test, y_test, predicted_y_init)
+        model.forecast = pd.Series(predictions['precip_mean_predicted'].to_numpy(), index=pd.DatetimeIndex(timeseries_dataset.data.loc[y_test.index, 'date'], name='date'))
+        return model, model.evaluate(y_test, predictions)
         
+    def predict_probabilistic(self, data_for_arima, hexagones=None, n_paths=2000, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), thresholds=(0.1, 1.0), random_state=0):
+        """
+        Prévisions probabilistes des 7 jours hors échantillon des modèles formés par run, par ré-échantillonnage des résidus
+        (cf ResidualBootstrapForecaster).
+
+        Parameters:
+            data_for_arima (DataFrame, HexPartitionedData ou HexTimeCube journalier): les données utilisées par run.
+            hexagones (list, optional): les hexagones (par défaut tous ceux de sarimax_models).
+            n_paths (int): le nombre de trajectoires simulées par hexagone.
+            quantiles (tuple): les niveaux des quantiles.
+            thresholds (tuple): les seuils des probabilités de dépassement.
+
+        Returns:
+            pd.DataFrame: une ligne par hexagone et jour (h3_hex_id, date, step, mean, q<niveau>..., p_gt_<seuil>...)
+        """
+        from scripts.modeler.probabilistic import ResidualBootstrapForecaster
+
+        forecaster = ResidualBootstrapForecaster(n_paths, quantiles=quantiles, thresholds=thresholds, y=getattr(self, "y", "precip_mean"), random_state=random_state)
+        return forecaster.run(data_for_arima, self.sarimax_models, hexagones)
+
     def save_model(self,filename='sarimax_models.pkl'):
         """
         Sauvegarde les paramètres des modèles SARIMAX formés pour chaque hexagone dans un fichier pickle.
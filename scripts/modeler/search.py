@@ -0,0 +1,253 @@
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from scripts.cache import fingerprint
+from scripts.modeler.sarimax import SARIMAXCustomModel
+from scripts.processor.feature_processor import FeaturesConstructor
+from scripts.processor.partition import HexPartitionedData
+
+# valeurs par défaut de LSTMModel.run pour les paramètres absents d'une configuration LSTM
+LSTM_DEFAULTS = {"units": 64, "activation": "relu", "loss": "mse", "optimizer": "adam", "epochs": 50, "time_steps": 7}
+
+# nombre maximal de lags de la cible que SARIMAXCustomModel.predict_test_OOS remplace par ses propres prévisions
+MAX_NB_LAG_VAR = 6
+
+
+def _evaluate_sarimax_hex(hex_id, data_for_arima_sample, instances, y):
+    """
+    Entraîne et évalue le modèle SARIMAXCustomModel d'un hexagone (exécuté dans un processus du pool).
+    """
+    model = SARIMAXCustomModel()
+    model.instances = instances
+    model.y = y
+    _, mae = model.train_hex(data_for_arima_sample)
+    return hex_id, mae
+
+
+def _successive_halving_lstm_hex(hex_id, single_data, configs, min_epochs, eta):
+    """
+    Successive halving des configurations LSTM pour un hexagone (exécuté dans un processus du pool).
+    Toutes les configurations sont entraînées min_epochs epochs, seul le meilleur 1/eta (MAE de validation) continue
+    jusqu'au palier suivant (budget multiplié par eta), et ainsi de suite jusqu'à leur nombre d'epochs maximal.
+
+    Returns:
+        tuple: (hex_id, liste de dictionnaires {config, epochs, val_mae, status})
+    """
+    from scripts.modeler.lstm import LSTMModel
+
+    runs = []
+    for config in configs:
+        params = dict(LSTM_DEFAULTS, **config)
+        lstm_model, X_train, X_valid, X_test, y_train, y_valid, y_test = LSTMModel.prepare_hex_splits(single_data, params["time_steps"])
+        lstm_model.model = lstm_model.create_model(X_train.shape[2], params["units"], params["activation"], params["loss"], params["optimizer"])
+        runs.append({"config": config, "model": lstm_model, "data": (X_train, y_train, X_valid, y_valid), "epochs": 0, "val_mae": np.nan, "status": "pruned", "max_epochs": params["epochs"]})
+
+    alive = runs
+    budget = min_epochs
+    while alive:
+        for run in alive:
+            target = min(budget, run["max_epochs"])
+            if target > run["epochs"]:
+                X_train, y_train, X_valid, y_valid = run["data"]
+                run["model"].resume_training(X_train, y_train, X_valid, y_valid, run["epochs"], target)
+                run["epochs"] = target
+                run["val_mae"] = run["model"].evaluate(y_valid, run["model"].model.predict(X_valid, verbose=0).ravel())
+        alive = sorted(alive, key=lambda run: np.nan_to_num(run["val_mae"], nan=np.inf))[:max(1, math.ceil(len(alive) / eta))]
+        for run in alive:
+            if run["epochs"] >= run["max_epochs"]:
+                run["status"] = "complete"
+        alive = [run for run in alive if run["status"] != "complete"]
+        budget *= eta
+
+    return hex_id, [{"config": run["config"], "epochs": run["epochs"], "val_mae": float(run["val_mae"]), "status": run["status"]} for run in runs]
+
+
+class HyperparameterSearch:
+    """
+    Classe HyperparameterSearch pour la recherche des hyperparamètres (nombres de lags de FeaturesConstructor.run,
+    paramètres de LSTMModel.run) sur une grille ou un espace aléatoire, en parallèle sur les hexagones.
+
+    L'agrégation journalière n'est calculée qu'une fois pour tous les nombres de lags, les configurations LSTM
+    sont départagées par successive halving et chaque résultat (configuration, hexagone) est écrit au fil de l'eau
+    dans un fichier JSON lines : une recherche interrompue reprend là où elle s'était arrêtée. Chaque résultat porte
+    l'empreinte des données de l'hexagone (et des paramètres du successive halving pour le LSTM) : après une mise à jour
+    des données ou un changement de min_epochs / eta, les résultats périmés sont recalculés au lieu d'être réutilisés.
+
+    Attributs:
+        results_file (str): Fichier JSON lines où sont persistés les résultats
+        n_jobs (int): Nombre de processus du pool (None : nombre de CPU)
+        random_state (int): Graine pour l'échantillonnage aléatoire de l'espace
+        results (dict): Résultats déjà calculés, indexés par (type de modèle, clé de configuration, hexagone)
+        data_keys (dict): Empreintes des données de la dernière recherche, par type de modèle puis par hexagone
+
+    Methods:
+        sample_configs: Renvoie la liste des configurations (grille complète ou n_iter tirages aléatoires)
+        search_sarimax: Recherche nb_lag_var / nb_lag_exo pour SARIMAXCustomModel (MAE hors échantillon sur 7 jours)
+        search_lstm: Recherche units / epochs / time_steps (et autres paramètres de create_model) pour LSTMModel
+        summary: Résume les résultats par configuration (moyenne sur les hexagones, configurations évaluées partout)
+        best_params: Renvoie la meilleure configuration
+    """
+
+    def __init__(self, results_file="models/search_results.jsonl", n_jobs=None, random_state=0):
+        self.results_file = results_file
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.results = self._load_results()
+        self.data_keys = {}
+
+    def _load_results(self):
+        results = {}
+        if os.path.exists(self.results_file):
+            with open(self.results_file) as file:
+                for line in file:
+                    if line.strip():
+                        record = json.loads(line)
+                        results[(record["model"], record["config_key"], record["h3_hex_id"])] = record
+        return results
+
+    def _save_result(self, record):
+        directory = os.path.dirname(self.results_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.results_file, "a") as file:
+            file.write(json.dumps(record, default=str) + "\n")
+        self.results[(record["model"], record["config_key"], record["h3_hex_id"])] = record
+
+    @staticmethod
+    def _data_key(frame, *settings):
+        return fingerprint(frame.reset_index(drop=True), *settings)
+
+    def _is_done(self, model, config_key, hex_id):
+        record = self.results.get((model, config_key, hex_id))
+        return record is not None and record.get("data_key") == self.data_keys[model].get(hex_id)
+
+    def sample_configs(self, space, n_iter=None):
+        """
+        Parameters:
+            space (dict): {paramètre: liste de valeurs (ou distribution scipy si n_iter est renseigné)}
+            n_iter (int, optional): nombre de tirages aléatoires ; grille complète si None
+
+        Returns:
+            list: liste de dictionnaires de paramètres
+        """
+        from sklearn.model_selection import ParameterGrid, ParameterSampler
+
+        if n_iter is None:
+            return list(ParameterGrid(space))
+        return list(ParameterSampler(space, n_iter=n_iter, random_state=self.random_state))
+
+    def search_sarimax(self, data, hexagones, space=None, n_iter=None):
+        """
+        Évalue chaque configuration de lags sur chaque hexagone (MAE des 7 derniers jours hors échantillon).
+
+        Parameters:
+            data (DataFrame): Données horaires (entrée de FeaturesConstructor.run)
+            hexagones (list): Hexagones évalués
+            space (dict, optional): Espace des paramètres nb_lag_var (au plus MAX_NB_LAG_VAR) / nb_lag_exo
+            n_iter (int, optional): Nombre de tirages aléatoires (grille complète si None)
+
+        Returns:
+            DataFrame: Résumé des configurations triées par MAE moyenne
+        """
+        space = space or {"nb_lag_var": list(range(1, MAX_NB_LAG_VAR + 1)), "nb_lag_exo": list(range(0, 4))}
+        if max(space["nb_lag_var"]) > MAX_NB_LAG_VAR:
+            raise ValueError(f"nb_lag_var > {MAX_NB_LAG_VAR} : SARIMAXCustomModel.predict_test_OOS ne remplace que les lags 1 à {MAX_NB_LAG_VAR} par les prévisions")
+        features_constructor = FeaturesConstructor()
+        aggregated_data = features_constructor.aggregate_data_by_day(data)
+        partition = HexPartitionedData(aggregated_data)
+        self.data_keys["sarimax"] = {hex_id: self._data_key(partition.get(hex_id)) for hex_id in hexagones if hex_id in partition}
+
+        with ProcessPoolExecutor(self.n_jobs) as executor:
+            futures = {}
+            for config in self.sample_configs(space, n_iter):
+                config_key = fingerprint(config)
+                pending = [hex_id for hex_id in self.data_keys["sarimax"] if not self._is_done("sarimax", config_key, hex_id)]
+                if not pending:
+                    continue
+                processed_data = features_constructor.build_features(aggregated_data, True, config["nb_lag_var"], config["nb_lag_exo"])
+                for hex_id, sample in processed_data[processed_data["h3_hex_id"].isin(pending)].groupby("h3_hex_id"):
+                    future = executor.submit(_evaluate_sarimax_hex, hex_id, sample, features_constructor.instances, features_constructor.y)
+                    futures[future] = (config_key, config)
+            for future in as_completed(futures):
+                config_key, config = futures[future]
+                hex_id, mae = future.result()
+                self._save_result({"model": "sarimax", "config_key": config_key, "config": config, "h3_hex_id": hex_id, "score": float(mae), "epochs": None, "status": "complete",
+                                   "data_key": self.data_keys["sarimax"][hex_id]})
+
+        return self.summary("sarimax")
+
+    def search_lstm(self, data_for_deep, hexagones, space=None, n_iter=None, min_epochs=5, eta=3):
+        """
+        Départage les configurations LSTM par successive halving, en parallèle sur les hexagones.
+
+        Parameters:
+            data_for_deep (DataFrame ou HexPartitionedData): Données journalières (entrée de LSTMModel.run)
+            hexagones (list): Hexagones évalués
+            space (dict, optional): Espace des paramètres (units, epochs, time_steps, activation, loss, optimizer ;
+                valeurs de LSTM_DEFAULTS pour les paramètres absents)
+            n_iter (int, optional): Nombre de tirages aléatoires (grille complète si None)
+            min_epochs (int): Budget du premier palier
+            eta (int): Facteur de réduction entre deux paliers
+
+        Returns:
+            DataFrame: Résumé des configurations triées par MAE de validation moyenne
+        """
+        space = space or {"units": [16, 32, 64, 128], "epochs": [25, 50, 100], "time_steps": [3, 5, 7, 14]}
+        configs = self.sample_configs(space, n_iter)
+        config_keys = [fingerprint(config) for config in configs]
+
+        if not isinstance(data_for_deep, HexPartitionedData):
+            data_for_deep = HexPartitionedData(data_for_deep)
+        samples = {hex_id: data_for_deep.get(hex_id) for hex_id in hexagones if hex_id in data_for_deep}
+        self.data_keys["lstm"] = {hex_id: self._data_key(single_data, {"min_epochs": min_epochs, "eta": eta}) for hex_id, single_data in samples.items()}
+
+        with ProcessPoolExecutor(self.n_jobs) as executor:
+            futures = []
+            for hex_id, single_data in samples.items():
+                if all(self._is_done("lstm", config_key, hex_id) for config_key in config_keys):
+                    continue
+                futures.append(executor.submit(_successive_halving_lstm_hex, hex_id, single_data, configs, min_epochs, eta))
+            for future in as_completed(futures):
+                hex_id, runs = future.result()
+                for run in runs:
+                    self._save_result({"model": "lstm", "config_key": fingerprint(run["config"]), "config": run["config"], "h3_hex_id": hex_id, "score": run["val_mae"], "epochs": run["epochs"], "status": run["status"],
+                                       "data_key": self.data_keys["lstm"][hex_id]})
+
+        return self.summary("lstm")
+
+    def summary(self, model):
+        """
+        Résume les résultats d'un type de modèle par configuration. Pour le LSTM, une configuration éliminée par le successive
+        halving sur un hexagone y compte pour sa dernière MAE de validation : une configuration menée au bout sur un seul
+        hexagone n'est pas jugée sur ce seul hexagone. Seules les configurations évaluées sur le plus grand nombre
+        d'hexagones (recherche complète) sont comparées. Après une recherche, seuls les résultats calculés sur les données
+        de cette recherche (même empreinte) sont pris en compte.
+
+        Parameters:
+            model (str): 'sarimax' ou 'lstm'
+
+        Returns:
+            DataFrame: une ligne par configuration (score moyen, nombre d'hexagones, nombre d'hexagones où elle est menée
+            au bout), triée par score croissant
+        """
+        data_keys = self.data_keys.get(model)
+        records = pd.DataFrame([record for key, record in self.results.items()
+                                if key[0] == model and (data_keys is None or record.get("data_key") == data_keys.get(key[2]))])
+        if records.empty:
+            return records
+        summary = records.groupby("config_key").agg(score=("score", "mean"), n_hex=("h3_hex_id", "nunique"),
+                                                    n_complete=("status", lambda status: int((status == "complete").sum())), config=("config", "first"))
+        summary = summary[summary["n_hex"] == summary["n_hex"].max()]
+        params = pd.DataFrame(summary["config"].tolist(), index=summary.index)
+        return pd.concat([params, summary.drop(columns=["config"])], axis=1).sort_values(["score", "n_complete"], ascending=[True, False])
+
+    def best_params(self, model):
+        """
+        Returns:
+            dict: la configuration de score moyen minimal pour le type de modèle donné
+        """
+        config_key = self.summary(model).index[0]
+        return next(record["config"] for key, record in self.results.items() if key[:2] == (model, config_key))
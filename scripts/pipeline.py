@@ -0,0 +1,348 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import pandas as pd
+from scripts.cache import fingerprint
+
+
+def path_digest(path, content=True):
+    """
+    Empreinte d'un fichier ou d'un dossier (parcours récursif, ordre des noms).
+
+    Parameters:
+        path (str): fichier ou dossier
+        content (bool): empreinte du contenu (False : noms, tailles et dates de modification seulement, pour les données brutes volumineuses)
+
+    Returns:
+        str: empreinte blake2b (16 octets)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if os.path.isdir(path):
+        files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+    else:
+        files = [path]
+    for file in files:
+        digest.update(os.path.relpath(file, path).encode())
+        if content:
+            with open(file, "rb") as handle:
+                for block in iter(lambda: handle.read(1 << 20), b""):
+                    digest.update(block)
+        else:
+            stat = os.stat(file)
+            digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def _signature(path):
+    stats = [os.stat(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names] if os.path.isdir(path) else [os.stat(path)]
+    return [len(stats), sum(stat.st_size for stat in stats), max((stat.st_mtime_ns for stat in stats), default=0)]
+
+
+def _hexagones(data, params):
+    hexagones = params.get("hexagones") or sorted(data["h3_hex_id"].unique())
+    return hexagones[:params["max_hexagones"]] if params.get("max_hexagones") else hexagones
+
+
+def _forecasts_frame(forecasts, model):
+    frames = [pd.DataFrame({"h3_hex_id": hex_id, "date": forecast.index, "model": model, "forecast": forecast.to_numpy()}) for hex_id, forecast in forecasts.items()]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["h3_hex_id", "date", "model", "forecast"])
+
+
+def ingest(params, inputs, outputs):
+    """
+    Chargement des CSV bruts, indexation H3 et agrégation horaire par hexagone (DaskDatabaseBuilder), exportée en cube
+    hexagone × heure × variable (HexTimeCube).
+    """
+    from scripts.extractor.database_builder import DaskDatabaseBuilder
+
+    builder = DaskDatabaseBuilder(params["hex_size"])
+    builder.load_data(params["raw_folder"])
+    builder.run()
+    builder.export_cube(outputs["data"], params["chunk_hours"])
+
+
+def features(params, inputs, outputs):
+    """
+    Agrégation journalière (une seule fois) puis construction des features SARIMAX (indicatrices, retards).
+    Les données journalières brutes servent au LSTM.
+    """
+    from scripts.processor.cube import HexTimeCube
+    from scripts.processor.feature_processor import FeaturesConstructor
+
+    constructor = FeaturesConstructor()
+    daily = constructor.aggregate_data_by_day(HexTimeCube(inputs["data"]).to_frame())
+    processed = constructor.build_features(daily, True, params["nb_lag_var"], params["nb_lag_exo"])
+    pd.to_pickle({"data": processed, "instances": constructor.instances, "y": constructor.y}, outputs["features"])
+    pd.to_pickle(daily, outputs["daily"])
+
+
+def train_sarimax(params, inputs, outputs):
+    """
+    Entraînement des modèles SARIMAXCustomModel par hexagone et prévisions des 7 derniers jours.
+    """
+    from scripts.modeler.sarimax import SARIMAXCustomModel
+
+    features = pd.read_pickle(inputs["features"])
+    model = SARIMAXCustomModel()
+    model.instances, model.y = features["instances"], features["y"]
+    model.run(features["data"], _hexagones(features["data"], params))
+    model.save_model(outputs["models"])
+    _forecasts_frame(model.sarimax_forecasts, "sarimax").to_csv(outputs["forecasts"], index=False)
+
+
+def forecast_sarimax(params, inputs, outputs):
+    """
+    Prévisions probabilistes (quantiles, probabilités de dépassement) des modèles SARIMAXCustomModel par ré-échantillonnage des résidus.
+    """
+    from scripts.modeler.probabilistic import ResidualBootstrapForecaster
+
+    features = pd.read_pickle(inputs["features"])
+    forecaster = ResidualBootstrapForecaster(params["n_paths"], y=features["y"])
+    forecaster.run(features["data"], pd.read_pickle(inputs["models"])).to_csv(outputs["quantiles"], index=False)
+
+
+def train_lstm(params, inputs, outputs):
+    """
+    Entraînement des modèles LSTMModel par hexagone et prévisions des 7 derniers jours.
+    """
+    from scripts.modeler.lstm import LSTMModel
+
+    daily = pd.read_pickle(inputs["daily"])
+    model = LSTMModel(None, "precip_mean")
+    model.run(daily, _hexagones(daily, params), units=params["units"], epochs=params["epochs"], time_steps=params["time_steps"])
+    model.save_models(outputs["models"])
+    _forecasts_frame(model.lstm_forecasts, "lstm").to_csv(outputs["forecasts"], index=False)
+
+
+def evaluate(params, inputs, outputs):
+    """
+    MAE des prévisions de chaque modèle, par hexagone, à partir des précipitations journalières observées.
+    """
+    daily = pd.read_pickle(inputs["daily"])[["h3_hex_id", "date", "precip_mean"]]
+    forecasts = pd.concat([pd.read_csv(inputs[name], parse_dates=["date"]) for name in ("sarimax", "lstm") if name in inputs], ignore_index=True)
+    merged = forecasts.merge(daily, on=["h3_hex_id", "date"], how="left")
+    merged["absolute_error"] = (merged["forecast"] - merged["precip_mean"]).abs()
+    evaluation = merged.groupby(["model", "h3_hex_id"])["absolute_error"].mean().rename("mae").reset_index()
+    evaluation.to_csv(outputs["evaluation"], index=False)
+    print(evaluation.groupby("model")["mae"].describe().to_string())
+
+
+class Stage:
+    """
+    Étape du pipeline : fonction (de niveau module, exécutable dans un processus du pool) appelée avec
+    function(params, inputs, outputs), où inputs et outputs associent un nom à un chemin.
+    Les dépendances entre étapes sont déduites des chemins : une étape dépend de celle qui produit l'une de ses entrées.
+    """
+
+    def __init__(self, name, function, inputs, outputs, params=None):
+        self.name = name
+        self.function = function
+        self.inputs = inputs
+        self.outputs = outputs
+        self.params = params or {}
+
+
+class Pipeline:
+    """
+    Classe Pipeline : exécution d'un graphe (DAG) d'étapes avec cache par empreinte de contenu.
+
+    La clé d'une étape est l'empreinte de son nom, de ses paramètres et des empreintes de ses entrées. Les empreintes
+    des sorties sont calculées sur leur contenu : une étape relancée qui produit des sorties identiques n'invalide donc
+    pas les étapes suivantes. Les entrées externes (données brutes) sont identifiées par les noms, tailles et dates de
+    modification des fichiers. Une étape est sautée si sa clé est celle du manifeste et que ses sorties n'ont pas changé
+    depuis. Les étapes indépendantes (ex: SARIMAX et LSTM) sont exécutées en parallèle dans un pool de processus.
+
+    Attributs:
+        stages (dict): Étapes, par nom
+        manifest_file (str): Fichier JSON des clés et empreintes des sorties des étapes déjà exécutées
+        n_jobs (int): Nombre d'étapes exécutées simultanément (1 : séquentiel, dans le processus courant)
+        force (set): Étapes à relancer même si elles sont à jour
+
+    Methods:
+        dependencies(): Étapes dont dépend chaque étape
+        run(targets): Exécute les étapes nécessaires à targets (toutes par défaut)
+    """
+
+    def __init__(self, stages, manifest_file="models/pipeline_manifest.json", n_jobs=2, force=()):
+        self.stages = {stage.name: stage for stage in stages}
+        self.manifest_file = manifest_file
+        self.n_jobs = n_jobs
+        self.force = set(force)
+        self.producers = {path: stage.name for stage in stages for path in stage.outputs.values()}
+        try:
+            with open(manifest_file) as file:
+                self.manifest = json.load(file)
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def dependencies(self):
+        return {name: {self.producers[path] for path in stage.inputs.values() if path in self.producers} for name, stage in self.stages.items()}
+
+    def _required(self, targets):
+        unknown = [name for name in targets if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Étapes inconnues : {', '.join(unknown)} (étapes du pipeline : {', '.join(self.stages)})")
+        dependencies = self.dependencies()
+        required, pending = set(), list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in required:
+                required.add(name)
+                pending.extend(dependencies[name])
+        return required
+
+    def _key(self, stage, digests):
+        inputs = {alias: digests[path] if path in self.producers else path_digest(path, content=False) for alias, path in stage.inputs.items()}
+        return fingerprint(stage.name, stage.params, inputs)
+
+    def _up_to_date(self, stage, key):
+        entry = self.manifest.get(stage.name)
+        if stage.name in self.force or entry is None or entry["key"] != key:
+            return False
+        return all(os.path.exists(path) and entry["outputs"].get(path, {}).get("signature") == _signature(path) for path in stage.outputs.values())
+
+    def _save_manifest(self):
+        directory = os.path.dirname(self.manifest_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_file = self.manifest_file + ".tmp"
+        with open(temporary_file, "w") as file:
+            json.dump(self.manifest, file, indent=2)
+        os.replace(temporary_file, self.manifest_file)
+
+    def _complete(self, stage, key, duration, digests):
+        outputs = {path: {"digest": path_digest(path), "signature": _signature(path)} for path in stage.outputs.values()}
+        self.manifest[stage.name] = {"key": key, "outputs": outputs, "duration": duration, "completed": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        self._save_manifest()
+        digests.update({path: output["digest"] for path, output in outputs.items()})
+
+    def run(self, targets=None):
+        """
+        Parameters:
+            targets (list, optional): Étapes à produire (avec leurs dépendances)
+
+        Returns:
+            dict: statut de chaque étape requise ('skipped', 'done', 'failed' ou 'blocked')
+        """
+        required = self._required(targets or list(self.stages))
+        dependencies = {name: deps & required for name, deps in self.dependencies().items() if name in required}
+        status, digests, running = {}, {}, {}
+
+        executor = ProcessPoolExecutor(self.n_jobs) if self.n_jobs != 1 else None
+        try:
+            while len(status) < len(required):
+                for name in sorted(required):
+                    if name in status or name in [running_name for running_name, _, _ in running.values()]:
+                        continue
+                    upstream = [status.get(dep) for dep in dependencies[name]]
+                    if any(value in ("failed", "blocked") for value in upstream):
+                        status[name] = "blocked"
+                        continue
+                    if not all(value in ("skipped", "done") for value in upstream):
+                        continue
+                    stage = self.stages[name]
+                    key = self._key(stage, digests)
+                    if self._up_to_date(stage, key):
+                        digests.update({path: output["digest"] for path, output in self.manifest[name]["outputs"].items()})
+                        status[name] = "skipped"
+                        print(f"[pipeline] {name}: à jour")
+                        continue
+                    for path in stage.outputs.values():
+                        directory = os.path.dirname(path)
+                        if directory:
+                            os.makedirs(directory, exist_ok=True)
+                    print(f"[pipeline] {name}: lancement")
+                    if executor is None:
+                        start = time.perf_counter()
+                        try:
+                            stage.function(stage.params, stage.inputs, stage.outputs)
+                        except Exception as error:
+                            print(f"[pipeline] {name}: échec ({error!r})")
+                            status[name] = "failed"
+                        else:
+                            self._complete(stage, key, time.perf_counter() - start, digests)
+                            status[name] = "done"
+                            print(f"[pipeline] {name}: terminé")
+                        continue
+                    running[executor.submit(stage.function, stage.params, stage.inputs, stage.outputs)] = (name, key, time.perf_counter())
+
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, key, start = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as error:
+                        print(f"[pipeline] {name}: échec ({error!r})")
+                        status[name] = "failed"
+                    else:
+                        self._complete(self.stages[name], key, time.perf_counter() - start, digests)
+                        status[name] = "done"
+                        print(f"[pipeline] {name}: terminé")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return status
+
+
+def build_stages(args):
+    intermediate, models = args.intermediate_dir, args.models_dir
+    data = os.path.join(intermediate, "hourly_cube")
+    features_file, daily = os.path.join(intermediate, "features.pkl"), os.path.join(intermediate, "daily.pkl")
+    sarimax_forecasts, lstm_forecasts = os.path.join(models, "sarimax_forecasts.csv"), os.path.join(models, "lstm_forecasts.csv")
+    selection = {"hexagones": args.hexagones, "max_hexagones": args.max_hexagones}
+    return [
+        Stage("ingest", ingest, {"raw": os.getcwd() + args.raw_folder}, {"data": data}, {"hex_size": args.hex_size, "raw_folder": args.raw_folder, "chunk_hours": args.chunk_hours}),
+        Stage("features", features, {"data": data}, {"features": features_file, "daily": daily}, {"nb_lag_var": args.nb_lag_var, "nb_lag_exo": args.nb_lag_exo}),
+        Stage("train_sarimax", train_sarimax, {"features": features_file}, {"models": os.path.join(models, "sarimax_models.pkl"), "forecasts": sarimax_forecasts}, selection),
+        Stage("forecast_sarimax", forecast_sarimax, {"features": features_file, "models": os.path.join(models, "sarimax_models.pkl")},
+              {"quantiles": os.path.join(models, "sarimax_quantiles.csv")}, {"n_paths": args.n_paths}),
+        Stage("train_lstm", train_lstm, {"daily": daily}, {"models": os.path.join(models, "lstm_models"), "forecasts": lstm_forecasts},
+              dict(selection, units=args.units, epochs=args.epochs, time_steps=args.time_steps)),
+        Stage("evaluate", evaluate, {"daily": daily, "sarimax": sarimax_forecasts, "lstm": lstm_forecasts}, {"evaluation": os.path.join(models, "evaluation.csv")}),
+    ]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m scripts.pipeline", description="Pipeline de prévision des précipitations : ingestion -> features -> entraînement (SARIMAX, LSTM) -> évaluation")
+    parser.add_argument("--raw-folder", default="/data/raw", help="dossier des CSV bruts, relatif au dossier courant (cf DaskDatabaseBuilder.load_data)")
+    parser.add_argument("--intermediate-dir", default="data/intermediate")
+    parser.add_argument("--models-dir", default="models")
+    parser.add_argument("--hex-size", type=int, default=3)
+    parser.add_argument("--chunk-hours", type=int, default=24 * 28, help="nombre d'heures par fichier du cube intermédiaire")
+    parser.add_argument("--nb-lag-var", type=int, default=1)
+    parser.add_argument("--nb-lag-exo", type=int, default=1)
+    parser.add_argument("--hexagones", nargs="*", default=None, help="hexagones modélisés (par défaut tous)")
+    parser.add_argument("--max-hexagones", type=int, default=None, help="nombre maximal d'hexagones modélisés")
+    parser.add_argument("--n-paths", type=int, default=2000, help="nombre de trajectoires Monte-Carlo par hexagone des prévisions probabilistes")
+    parser.add_argument("--units", type=int, default=64)
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--time-steps", type=int, default=7)
+    parser.add_argument("--jobs", type=int, default=2, help="nombre d'étapes exécutées simultanément")
+    # noms des étapes du DAG (construit avec les valeurs par défaut des options) : un nom inconnu est rejeté par argparse
+    names = [stage.name for stage in build_stages(parser.parse_args([]))]
+    parser.add_argument("--force", nargs="*", default=[], choices=names, metavar="STAGE", help="étapes à relancer même si elles sont à jour")
+    parser.add_argument("targets", nargs="*", metavar="STAGE", help=f"étapes à produire (par défaut toutes) : {', '.join(names)}")
+    args = parser.parse_args(argv)
+    # pas de choices= sur un positionnel nargs="*" : argparse (< 3.12) rejetterait la liste vide par défaut
+    unknown = [name for name in args.targets if name not in names]
+    if unknown:
+        parser.error(f"argument STAGE: invalid choice: {unknown[0]!r} (choose from {', '.join(map(repr, names))})")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    pipeline = Pipeline(build_stages(args), os.path.join(args.models_dir, "pipeline_manifest.json"), args.jobs, args.force)
+    status = pipeline.run(args.targets or None)
+    print(json.dumps(status, indent=2))
+    return 0 if all(value in ("skipped", "done") for value in status.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,30 @@
+from scripts.plotter.rendering import DownsampledFigure
+
+
+def plot_forecast(y_true, y_pred, mae, title, xaxis_title='Jours', yaxis_title='Pluviométrie', n_points=2000, interactive=False):
+    """
+    Affiche les valeurs réelles et prédites d'un modèle (SARIMAXCustomModel, LSTMModel) et leur MAE.
+
+    Parameters:
+        y_true : Series ou liste contenant les valeurs réelles
+        y_pred : Series ou liste contenant les valeurs prédites
+        mae (float) : Erreur absolue moyenne affichée au-dessus du graphique
+        title : Titre du graphique
+        xaxis_title : Titre de l'axe des abscisses (default : 'Jours')
+        yaxis_title : Titre de l'axe des ordonnées (default : 'Pluviométrie')
+        n_points : Nombre de points affichés par courbe, rendu WebGL sous-échantillonné (default : 2000)
+        interactive : Sous-échantillonnage recalculé au zoom (go.FigureWidget, notebook) (default : False)
+    """
+    annotation = dict(
+        x=0.5,
+        y=1.05,
+        xref='paper',
+        yref='paper',
+        text="Mean Absolute Error: {:.4f}".format(mae),
+        showarrow=False,
+        font=dict(size=14)
+    )
+    fig = DownsampledFigure(n_points=n_points, xaxis_title=xaxis_title, yaxis_title=yaxis_title, title=title, annotations=[annotation])
+    fig.add_line(None, y_true, name='True Values', line=dict(color='red'))
+    fig.add_line(None, y_pred, name='Predicted Values', line=dict(color='blue'))
+    fig.show(interactive)
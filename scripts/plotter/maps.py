@@ -0,0 +1,53 @@
+from h3 import h3
+import plotly.graph_objects as go
+
+
+def plot_hexagons_on_mapbox(stations, color='red'):
+    """
+    Génère un graphique de type Scattermapbox avec des hexagones H3 et des stations météorologiques.
+
+    Parameters:
+        stations (DataFrame): Les stations météorologiques avec leurs identifiants H3 (sortie de H3Processor.get_h3_components).
+        color (str): La couleur des hexagones H3.
+
+    Returns:
+        None: Affiche le graphique interactif.
+    """
+    hexagons = stations['h3_hex_id'].unique().tolist()
+
+    hexagon_features = []
+    for hex in hexagons:
+        polygon = h3.h3_to_geo_boundary(hex, geo_json=True)
+        hexagon_feature = {"type": "Feature",
+                        "geometry": {"type": "Polygon", "coordinates": [polygon]}}
+        hexagon_features.append(hexagon_feature)
+
+    hexagon_collection = {"type": "FeatureCollection", "features": hexagon_features}
+
+    hexagon_traces = []
+    for feature in hexagon_collection['features']:
+        trace = go.Scattermapbox(
+            lat=[feature['geometry']['coordinates'][0][i][1] for i in range(7)],
+            lon=[feature['geometry']['coordinates'][0][i][0] for i in range(7)],
+            mode='lines',
+            line=dict(width=1, color=color),
+            fill='none',
+            showlegend=False,
+            hoverinfo='none')
+        hexagon_traces.append(trace)
+
+    station_trace = go.Scattermapbox(
+        lat=stations['lat'],
+        lon=stations['lon'],
+        mode='markers',
+        showlegend=False,
+        marker=dict(size=3, color='black', opacity=0.5),
+        hoverinfo='text',
+        text=stations['number_sta'])
+
+    layout = go.Layout(mapbox_style="open-street-map",mapbox_zoom=4,  # Set the initial zoom level
+        mapbox_center={"lat": stations['lat'].mean(), "lon": stations['lon'].mean()})
+
+    fig = go.Figure(data=hexagon_traces + [station_trace], layout=layout)
+
+    fig.show()
@@ -1,26 +1,94 @@
 import plotly.figure_factory as ff
+import numpy as np
 import pandas as pd
 import plotly.express as px
+from scripts.processor.cube import HexTimeCube
+from scripts.plotter.rendering import DownsampledFigure
+
+
+class DailyAggregateCube:
+    """
+    Cube d'agrégats journaliers : somme et nombre d'observations par (hexagone, jour) pour chaque indicateur, calculés en une
+    seule passe sur les données brutes. Les niveaux semaine / mois / année et le total tous hexagones sont obtenus en cumulant
+    ces sommes et effectifs (moyenne = somme / effectif), sans reparcourir les lignes brutes, et sont mis en cache.
+
+    Attributes:
+    sums (pd.DataFrame): Sommes par (hexagone, jour) pour chaque indicateur.
+    counts (pd.DataFrame): Nombre de valeurs non manquantes par (hexagone, jour) pour chaque indicateur.
+
+    Methods:
+
+    rollup(self, freq, by_hex=True)
+        Renvoie les moyennes par période (et par hexagone si by_hex) au format long.
+
+    from_hex_time_cube(cube, indicators=None)
+        Construit les agrégats journaliers fichier par fichier à partir d'un HexTimeCube horaire (sans passer par le format long).
+    """
+    def __init__(self, df, indicators, date_col="date", hex_col="h3_hex_id"):
+        self.date_col = date_col
+        self.hex_col = hex_col
+        days = pd.to_datetime(df[date_col]).dt.normalize()
+        values = df[indicators].astype(float)
+        keys = [df[hex_col].rename(hex_col), days.rename(date_col)]
+        self.sums = values.groupby(keys).sum()
+        self.counts = values.groupby(keys).count()
+        self._rollups = {}
+
+    @classmethod
+    def from_hex_time_cube(cls, cube, indicators=None, date_col="date", hex_col="h3_hex_id"):
+        indicators = cube.variables if indicators is None else list(indicators)
+        sums, counts = [], []
+        for times, block in cube.iter_blocks(variables=indicators):
+            days = times.normalize()
+            starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+            observed = ~np.isnan(block)
+            day_sums = np.add.reduceat(np.where(observed, block, 0).astype(float), starts, axis=1).reshape(-1, len(indicators))
+            day_counts = np.add.reduceat(observed, starts, axis=1).reshape(-1, len(indicators))
+            index = pd.MultiIndex.from_product([cube.hexagones, days[starts]], names=[hex_col, date_col])
+            present = day_counts.sum(axis=1) > 0
+            sums.append(pd.DataFrame(day_sums[present], index=index[present], columns=indicators))
+            counts.append(pd.DataFrame(day_counts[present], index=index[present], columns=indicators))
+        aggregates = cls.__new__(cls)
+        aggregates.date_col = date_col
+        aggregates.hex_col = hex_col
+        # un jour à cheval sur deux fichiers apparaît deux fois : les sommes et effectifs partiels sont cumulés
+        aggregates.sums = pd.concat(sums).groupby(level=[0, 1]).sum()
+        aggregates.counts = pd.concat(counts).groupby(level=[0, 1]).sum()
+        aggregates._rollups = {}
+        return aggregates
+
+    def rollup(self, freq, by_hex=True):
+        key = (freq, by_hex)
+        if key not in self._rollups:
+            days = self.sums.index.get_level_values(self.date_col)
+            labels = days if freq == 'D' else days.to_period(freq).end_time.normalize()
+            groups = [self.sums.index.get_level_values(self.hex_col), labels.rename(self.date_col)] if by_hex else [labels.rename(self.date_col)]
+            means = self.sums.groupby(groups).sum() / self.counts.groupby(groups).sum()
+            self._rollups[key] = means.reset_index()
+        return self._rollups[key]
+
 
 class WeatherVisualizations:
     """
     Une classe pour créer différentes visualisations météo en utilisant Plotly Express.
 
     Attributes:
-    df (pd.DataFrame): Un DataFrame contenant les données météo.
+    df (pd.DataFrame ou HexTimeCube): Un DataFrame contenant les données météo, ou le cube horaire sur disque (lu fichier par fichier).
     indicateurs (list): Une liste de chaînes de caractères représentant les indicateurs météo à visualiser.
     date_col (str): Le nom de la colonne contenant les dates dans le DataFrame.
     freq_map (dict): Un dictionnaire qui mappe les fréquences ("jour", "semaine", "mois", "année") aux fréquences de pandas.
+    cube (DailyAggregateCube): Agrégats journaliers calculés une seule fois, dont dérivent toutes les fréquences.
 
     Methods:
     
     aggregate_data(self, df, freq)
         Agrège les données météo en utilisant une fréquence donnée.
 
-    plot_data(self, freq, indicateurs, all=False)
-        Trace une série temporelle pour chaque indicateur météo en utilisant une fréquence donnée.
+    plot_data(self, freq, indicateurs, all=False, webgl=True, n_points=2000, interactive=False)
+        Trace une série temporelle pour chaque indicateur météo en utilisant une fréquence donnée (WebGL sous-échantillonné par défaut,
+        recalculé au zoom dans un notebook si interactive).
 
-    create_frequency_subplots(self, indicateurs, all=False)
+    create_frequency_subplots(self, indicateurs, all=False, webgl=True, interactive=False)
         Trace un sous-tracé pour chaque fréquence pour chaque indicateur météo.
 
     plot_correlation_heatmap(self)
@@ -30,35 +98,52 @@ class WeatherVisualizations:
         Trace un scatter plot pour chaque indicateur météo agrégé par jour.
     """
     def __init__(self, df, indicators=['precip', 'td', 'hu', 'dd', 'psl', 'ff', 'h3_hex_id_neighbor_0_precip', 'h3_hex_id_neighbor_1_precip', 'h3_hex_id_neighbor_2_precip']):
-        self.data = df.copy()
+        self.data = df if isinstance(df, HexTimeCube) else df.copy()
         self.indicators = indicators
         self.date_col = "date"
         self.freq_map = {'jour': 'D', 'semaine': 'W', 'mois': 'M', 'année': 'Y'}
 
+    @property
+    def cube(self):
+        if getattr(self, "_cube", None) is None and isinstance(self.data, HexTimeCube):
+            self._cube = DailyAggregateCube.from_hex_time_cube(self.data, [col for col in self.data.variables if col != "h3_hex_id"], self.date_col)
+        if getattr(self, "_cube", None) is None:
+            columns = [col for col in self.data.select_dtypes('number').columns if col != "h3_hex_id"]
+            self._cube = DailyAggregateCube(self.data, columns, self.date_col)
+        return self._cube
+
     def aggregate_data(self, df, freq):
+        if df is self.data:
+            return self.cube.rollup(freq, by_hex=False)
         data = df.copy()
         data["date"] = pd.to_datetime(data["date"])
         return data.groupby(pd.Grouper(key=self.date_col, freq=freq)).mean().reset_index()
 
-    def plot_data(self, freq, indicators, all=False):
+    def plot_data(self, freq, indicators, all=False, webgl=True, n_points=2000, interactive=False):
 
         if all:
             title = f"Série agrégée par {freq}"
             color_col = None
-            agg_data = self.aggregate_data(self.data, self.freq_map[freq])
         else:
             title = f"Série par hexagone - {freq}"
             color_col = "h3_hex_id"
-            agg_data = self.data.groupby([color_col, pd.Grouper(key=self.date_col, freq=self.freq_map[freq])]).mean().reset_index()
+        agg_data = self.cube.rollup(self.freq_map[freq], by_hex=not all)
 
         for indicator in indicators:
-            fig = px.line(agg_data, x="date", y=indicator, color=color_col, title=title)
-            fig.show()
-
-    def create_frequency_subplots(self, indicators, all=False):
+            if not webgl:
+                fig = px.line(agg_data, x="date", y=indicator, color=color_col, title=title)
+                fig.show()
+                continue
+            fig = DownsampledFigure(n_points=n_points, title=title, xaxis_title="date", yaxis_title=indicator)
+            groups = [(indicator, agg_data)] if all else agg_data.groupby(color_col)
+            for name, group in groups:
+                fig.add_line(group["date"].to_numpy(), group[indicator].to_numpy(), name=name)
+            fig.show(interactive)
+
+    def create_frequency_subplots(self, indicators, all=False, webgl=True, interactive=False):
         freqs = ["jour", "semaine", "mois", "année"]
         for freq in freqs:
-            self.plot_data(freq, indicators, all)
+            self.plot_data(freq, indicators, all, webgl, interactive=interactive)
 
     def plot_correlation_heatmap(self):
 
@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+
+def _buckets(y, n_buckets):
+    """
+    Découpe une série en n_buckets tranches de points consécutifs (la dernière complétée par des NaN).
+
+    Returns:
+        tuple: (décalage du premier point de chaque tranche non vide, tranches non vides (n, taille))
+    """
+    y = np.asarray(y, dtype=float)
+    size = int(np.ceil(len(y) / n_buckets))
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:len(y)] = y
+    buckets = padded.reshape(n_buckets, size)
+    valid = ~np.all(np.isnan(buckets), axis=1)
+    return np.arange(n_buckets)[valid] * size, buckets[valid]
+
+
+def minmax_indices(y, n_buckets):
+    """
+    Sous-échantillonnage min/max : conserve, pour chaque tranche de points consécutifs, l'indice du minimum et du maximum.
+    Les extrêmes (épisodes de fortes précipitations) restent donc toujours visibles. Les valeurs manquantes sont ignorées
+    et les tranches sans aucune valeur ne donnent aucun indice.
+
+    Parameters:
+        y (np.ndarray): valeurs de la série
+        n_buckets (int): nombre de tranches
+
+    Returns:
+        np.ndarray: indices conservés, triés (au plus 2 * n_buckets)
+    """
+    offsets, buckets = _buckets(y, n_buckets)
+    indices = np.concatenate([offsets + np.nanargmin(buckets, axis=1), offsets + np.nanargmax(buckets, axis=1)])
+    return np.unique(indices)
+
+
+def max_indices(y, n_buckets):
+    """
+    Returns:
+        np.ndarray: indice du maximum de chaque tranche de points consécutifs (au plus n_buckets, triés), cf minmax_indices
+    """
+    offsets, buckets = _buckets(y, n_buckets)
+    return offsets + np.nanargmax(buckets, axis=1)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Sous-échantillonnage Largest-Triangle-Three-Buckets : conserve dans chaque tranche le point formant le plus grand triangle
+    avec le point retenu dans la tranche précédente et la moyenne de la tranche suivante.
+
+    Parameters:
+        x (np.ndarray): abscisses numériques, croissantes
+        y (np.ndarray): valeurs de la série (sans valeur manquante)
+        n_out (int): nombre de points conservés (premier et dernier points inclus)
+
+    Returns:
+        np.ndarray: indices conservés, triés
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x, next_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+        areas = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous]) - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        indices[bucket + 1] = previous
+    return indices
+
+
+class DownsampledFigure:
+    """
+    Figure Plotly en rendu WebGL (go.Scattergl) dont les longues séries sont sous-échantillonnées côté serveur
+    (min/max ou LTTB) à une largeur cible en pixels, au lieu d'envoyer tous les points au navigateur en SVG.
+    En mode interactif (FigureWidget, dans un notebook), le sous-échantillonnage est recalculé uniquement lorsque
+    la fenêtre de zoom de l'axe des abscisses change.
+
+    Attributes:
+        n_points (int): Largeur cible (nombre maximal de points par trace après sous-échantillonnage)
+        method (str): 'minmax' (extrêmes garantis) ou 'lttb' (avec conservation du maximum de chaque tranche)
+        series (list): Séries complètes (x, y, paramètres de trace)
+
+    Methods:
+        add_line(x, y, name, **trace_kwargs): Ajoute une série
+        downsample(x, y, x_range): Sous-échantillonne une série sur une fenêtre
+        build(interactive): Construit la figure (go.Figure ou go.FigureWidget)
+        show(interactive): Affiche la figure
+    """
+
+    def __init__(self, n_points=2000, method="minmax", **layout):
+        self.n_points = n_points
+        self.method = method
+        self.layout = layout
+        self.series = []
+        self._last_range = None
+
+    def add_line(self, x, y, name=None, **trace_kwargs):
+        y = np.asarray(y, dtype=float)
+        x = np.arange(len(y)) if x is None else np.asarray(x)
+        self.series.append((x, y, dict(name=name, mode="lines", **trace_kwargs)))
+        return self
+
+    @staticmethod
+    def _numeric(x):
+        if np.issubdtype(x.dtype, np.datetime64):
+            return x.astype("datetime64[ns]").astype(np.int64).astype(float)
+        return x.astype(float)
+
+    def downsample(self, x, y, x_range=None):
+        """
+        Parameters:
+            x (np.ndarray): abscisses (numériques ou dates), croissantes
+            y (np.ndarray): valeurs
+            x_range (tuple, optional): fenêtre (début, fin) affichée
+
+        Returns:
+            tuple: (x, y) sous-échantillonnés
+        """
+        if x_range is not None:
+            bounds = pd.to_datetime(list(x_range)).to_numpy() if np.issubdtype(x.dtype, np.datetime64) else np.asarray(x_range, dtype=float)
+            start, stop = np.searchsorted(x, bounds[0], side="left"), np.searchsorted(x, bounds[1], side="right")
+            x, y = x[max(start - 1, 0):stop + 1], y[max(start - 1, 0):stop + 1]
+        if len(y) <= self.n_points:
+            return x, y
+        if self.method == "lttb":
+            # budget partagé : LTTB sur les trois quarts des points, maximum de chaque tranche sur le dernier quart
+            n_maxima = self.n_points // 4
+            observed = np.flatnonzero(~np.isnan(y))
+            indices = observed[lttb_indices(self._numeric(x[observed]), y[observed], self.n_points - n_maxima)]
+            if n_maxima:
+                indices = np.union1d(indices, max_indices(y, n_maxima))
+        else:
+            indices = minmax_indices(y, self.n_points // 2)
+        return x[indices], y[indices]
+
+    def build(self, interactive=False):
+        """
+        Parameters:
+            interactive (bool): go.FigureWidget recalculant le sous-échantillonnage au zoom (notebook) si True
+
+        Returns:
+            go.Figure ou go.FigureWidget
+        """
+        traces = []
+        for x, y, trace_kwargs in self.series:
+            x_sampled, y_sampled = self.downsample(x, y)
+            traces.append(go.Scattergl(x=x_sampled, y=y_sampled, **trace_kwargs))
+        if not interactive:
+            return go.Figure(data=traces, layout=self.layout)
+
+        figure = go.FigureWidget(data=traces, layout=self.layout)
+
+        def on_zoom(layout, x_range):
+            x_range = None if x_range is None else tuple(x_range)
+            if x_range == self._last_range:
+                return
+            self._last_range = x_range
+            with figure.batch_update():
+                for trace, (x, y, _) in zip(figure.data, self.series):
+                    trace.x, trace.y = self.downsample(x, y, x_range)
+
+        figure.layout.on_change(on_zoom, "xaxis.range")
+        return figure
+
+    def show(self, interactive=False):
+        """
+        Parameters:
+            interactive (bool): affiche un go.FigureWidget (notebook) recalculant le sous-échantillonnage au zoom si True
+        """
+        figure = self.build(interactive)
+        if interactive:
+            from IPython.display import display
+
+            display(figure)
+        else:
+            figure.show()
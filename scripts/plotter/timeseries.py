@@ -1,8 +1,10 @@
-from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
-import matplotlib.pyplot as plt
-from statsmodels.tsa.seasonal import STL
 import plotly.graph_objs as go
 import plotly.express as px
+import numpy as np
+import pandas as pd
+from scripts.correlation import CorrelationEngine
+from scripts.decomposition import STLDecomposer
+from scripts.plotter.rendering import DownsampledFigure
 
 class TimeSeriesPlots:
     """
@@ -11,39 +13,44 @@ class TimeSeriesPlots:
     
     Attributs:
         time_series (pd.Series): une série avec en index les dates
+        decomposer (STLDecomposer): service de décomposition de l'instance (par défaut, cache mémoire borné aux MAX_CACHED_DECOMPOSITIONS dernières séries) ;
+            un même STLDecomposer peut être passé à plusieurs instances pour réutiliser les décompositions déjà calculées
     Methods:
         plot_stl_decomposition(period): Affiche la décomposition STL
         show_acf_pacf(lags): Affiche des graphiques de la fonction d'autocorrélation (ACF)
-        plot_correlation_lags(data): Affiche un graphique de l'ensemble des corrélations au lag 1 pour chaque hexagone (pour une variable donnée)
+        plot_correlation_lags(data, variable, lag, partial): Affiche un graphique de l'ensemble des corrélations au lag k pour chaque hexagone (pour une variable donnée)
     """
-    def __init__(self, time_series):
+    MAX_CACHED_DECOMPOSITIONS = 16
+
+    def __init__(self, time_series, decomposer=None):
         self.time_series = time_series
+        self.decomposer = decomposer if decomposer is not None else STLDecomposer(n_jobs=1, max_cached=self.MAX_CACHED_DECOMPOSITIONS)
 
-    def plot_stl_decomposition(self, period=365): 
+    def plot_stl_decomposition(self, period=365, n_points=2000, interactive=False): 
         """
         Affiche la décomposition STL (Saison-Tendance-Résidus) de la série temporelle.
         
         Paramètres:
             period (int) : La période saisonnière de la série temporelle (par défaut 365).
+            n_points (int) : Nombre de points affichés par courbe (sous-échantillonnage WebGL, cf DownsampledFigure).
+            interactive (bool) : Recalcule le sous-échantillonnage au zoom (FigureWidget, notebook).
         """
-        stl = STL(self.time_series, period=period)
-        result = stl.fit()
+        result = self.decomposer.decompose(self.time_series, periods=(period,))
         trend = result.trend
         seasonal = result.seasonal
         residual = result.resid
 
-        fig = go.Figure()
-
-        fig.add_trace(go.Scatter(x=self.time_series.index, y=self.time_series, mode='lines', name='Série originale'))
-        fig.add_trace(go.Scatter(x=trend.index, y=trend, mode='lines', name='Tendance'))
-        fig.add_trace(go.Scatter(x=seasonal.index, y=seasonal, mode='lines', name='Saisonnalité'))
-        fig.add_trace(go.Scatter(x=residual.index, y=residual, mode='lines', name='Résidus'))
+        fig = DownsampledFigure(n_points=n_points,
+                                title='Décomposition STL de la série temporelle',
+                                xaxis_title='Date',
+                                yaxis_title='Valeur')
 
-        fig.update_layout(title='Décomposition STL de la série temporelle',
-                          xaxis_title='Date',
-                          yaxis_title='Valeur')
+        fig.add_line(self.time_series.index.to_numpy(), self.time_series, name='Série originale')
+        fig.add_line(trend.index.to_numpy(), trend, name='Tendance')
+        fig.add_line(seasonal.index.to_numpy(), seasonal, name='Saisonnalité')
+        fig.add_line(residual.index.to_numpy(), residual, name='Résidus')
 
-        fig.show()
+        fig.show(interactive)
 
     def show_acf_pacf(self, lags=30):
         """
@@ -52,38 +59,41 @@ class TimeSeriesPlots:
         Paramètres:
             lags (int) : Le nombre de décalages (lags) à afficher dans les graphiques (par défaut 30).
         """
-        fig, axs = plt.subplots(nrows=1, ncols=2, figsize=(12, 5))
+        import matplotlib.pyplot as plt
 
-        # plot ACF on the left subplot
-        plot_acf(self.time_series, lags=lags, ax=axs[0])
-        axs[0].set_title("ACF of " + self.time_series.name)
+        engine = CorrelationEngine(lags)
+        acf = engine.acf(self.time_series.to_numpy())
+        pacf = engine.pacf(acf)
+        nobs = self.time_series.notna().sum()
+        fig, axs = plt.subplots(nrows=1, ncols=2, figsize=(12, 5))
 
-        # plot PACF on the right subplot
-        plot_pacf(self.time_series, lags=lags, ax=axs[1])
-        axs[1].set_title("PACF of " +  self.time_series.name)
+        # plot ACF on the left subplot, PACF on the right subplot
+        for ax, values, confint, name in [(axs[0], acf[0], engine.acf_confint(acf, nobs)[0], "ACF"),
+                                          (axs[1], pacf[0], engine.pacf_confint(nobs, lags), "PACF")]:
+            ax.vlines(np.arange(lags + 1), 0, values)
+            ax.plot(np.arange(lags + 1), values, marker="o", linestyle="None")
+            ax.axhline(0, color="black", linewidth=0.8)
+            ax.fill_between(np.arange(lags + 1), -confint, confint, alpha=0.25, linewidth=0)
+            ax.set_title(name + " of " + str(self.time_series.name))
 
         # show the plot for each variable
         plt.show()
 
-    def plot_correlation_lags(self,time_series_all):
+    def plot_correlation_lags(self, time_series_all, variable='precip', lag=1, partial=False):
         """
-        Affiche un graphique montrant la corrélation entre la série de précipitations observée et
-        la série retardée de 1 jour pour l'ensemble des variables
+        Affiche un graphique montrant, pour chaque hexagone, la corrélation entre la série observée et
+        la série retardée de lag pas de temps (autocorrélation partielle si partial est True)
         """
-        dataframe = time_series_all.copy()
-        dataframe['precip_t_1'] = dataframe.groupby('h3_hex_id')['precip'].shift(1)
-        dataframe.dropna(subset=['precip_t_1'], inplace=True)
-
-        correlations = dataframe.groupby('h3_hex_id').apply(lambda x: x[['precip', 'precip_t_1']].corr().iloc[0, 1]).reset_index()
+        correlations = CorrelationEngine().lag_correlation_map(time_series_all, variable, [lag], partial)
         correlations.columns = ['h3_hex_id', 'correlation']
         correlations.sort_values(by='correlation', ascending=True, inplace=True)
 
         fig = px.bar(correlations, x='h3_hex_id', y='correlation', text='correlation')
         fig.update_traces(texttemplate='%{text:.3f}', textposition='outside')
         fig.update_layout(
-            title="Corrélation entre les précipitations et les précipitations retardées de 1 jour",
+            title=f"Corrélation {'partielle ' if partial else ''}entre {variable} et {variable} retardé de {lag} pas de temps",
             xaxis_title="Régions",
             yaxis_title="Corrélation",
             xaxis_tickangle=-45
         )
-        fig.show()
\ No newline at end of file
+        fig.show()
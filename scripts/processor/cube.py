@@ -0,0 +1,171 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+
+class HexTimeCube:
+    """
+    Classe HexTimeCube : cube dense hexagone × temps × variable stocké sur disque, format intermédiaire des données horaires
+    (ou journalières) à la place d'un grand CSV long re-parsé à chaque étape.
+
+    Le cube est découpé selon le temps en fichiers .npy de forme (n_hex, chunk_size, n_var), en float32 avec NaN pour les
+    valeurs manquantes ; coords.json contient les coordonnées (hexagones triés, date de début, fréquence, variables).
+    Les fichiers sont ouverts en mémoire mappée (np.load(mmap_mode='r')) : la lecture d'un ensemble d'hexagones sur une
+    période ne charge que les pages concernées. Dans un fichier, les pas de temps d'un hexagone sont contigus.
+
+    Attributs:
+        path (str): Dossier du cube
+        hexagones (list): Hexagones (ordre des lignes)
+        variables (list): Variables (ordre de la dernière dimension)
+        start (pd.Timestamp): Date du premier pas de temps
+        freq (str): Fréquence des pas de temps ('H' ou 'D')
+        n_times (int): Nombre de pas de temps
+        chunk_size (int): Nombre de pas de temps par fichier
+
+    Methods:
+        write(data, path, variables, ...): Écrit un cube à partir de données au format long (classmethod)
+        times: Dates de tous les pas de temps
+        iter_blocks(hexagones, start, end, variables): Itère sur les blocs (dates, tableau) fichier par fichier
+        read(hexagones, start, end, variables): Lit un sous-cube (hexagones, dates, tableau (n_hex, n_dates, n_var))
+        to_frame(hexagones, start, end, variables): Lit un sous-cube au format long (une ligne par hexagone et date)
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "coords.json")) as file:
+            coords = json.load(file)
+        self.path = path
+        self.hexagones = coords["hexagones"]
+        self.variables = coords["variables"]
+        self.start = pd.Timestamp(coords["start"])
+        self.freq = coords["freq"]
+        self.n_times = coords["n_times"]
+        self.chunk_size = coords["chunk_size"]
+        self.hex_index = {hex_id: i for i, hex_id in enumerate(self.hexagones)}
+        self._chunks = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_chunks"] = {}
+        return state
+
+    def __len__(self):
+        return len(self.hexagones)
+
+    @staticmethod
+    def _chunk_file(path, k):
+        return os.path.join(path, f"chunk_{k:05d}.npy")
+
+    @classmethod
+    def write(cls, data, path, variables=None, hex_column="h3_hex_id", time_column="date", freq="H", chunk_size=24 * 28):
+        """
+        Écrit un cube à partir de données au format long (une ligne par hexagone et pas de temps ; en cas de doublon,
+        la dernière ligne l'emporte). Le premier pas de temps est arrondi au jour, de sorte qu'un fichier de données
+        horaires contienne des jours entiers lorsque chunk_size est un multiple de 24.
+
+        Parameters:
+            data (pd.DataFrame): données contenant hex_column, time_column et les variables
+            path (str): dossier du cube (créé si besoin)
+            variables (list, optional): variables stockées (par défaut toutes les colonnes numériques)
+            freq (str): fréquence des pas de temps ('H' : horaire, 'D' : journalier)
+            chunk_size (int): nombre de pas de temps par fichier (4 semaines en horaire par défaut)
+
+        Returns:
+            HexTimeCube: le cube écrit
+        """
+        if variables is None:
+            variables = [col for col in data.select_dtypes(include=["number", "bool"]).columns if col not in (hex_column, time_column)]
+        step = pd.Timedelta(pd.tseries.frequencies.to_offset(freq))
+        times = pd.to_datetime(data[time_column]).dt.floor(freq)
+        start = times.min().floor("D")
+        time_codes = ((times - start) // step).to_numpy()
+        hex_codes, hexagones = pd.factorize(data[hex_column], sort=True)
+        values = data[variables].to_numpy(dtype=np.float32)
+        n_times = int(time_codes.max()) + 1
+        n_chunks = -(-n_times // chunk_size)
+
+        os.makedirs(path, exist_ok=True)
+        order = np.argsort(time_codes, kind="stable")
+        boundaries = np.searchsorted(time_codes[order], np.arange(n_chunks + 1) * chunk_size)
+        for k in range(n_chunks):
+            rows = order[boundaries[k]:boundaries[k + 1]]
+            temporary_file = cls._chunk_file(path, k) + ".tmp.npy"
+            chunk = np.lib.format.open_memmap(temporary_file, mode="w+", dtype=np.float32, shape=(len(hexagones), chunk_size, len(variables)))
+            chunk[:] = np.nan
+            chunk[hex_codes[rows], time_codes[rows] - k * chunk_size] = values[rows]
+            chunk.flush()
+            del chunk
+            os.replace(temporary_file, cls._chunk_file(path, k))
+
+        coords = {"hexagones": list(hexagones), "variables": list(variables), "start": start.isoformat(), "freq": freq, "n_times": n_times, "chunk_size": chunk_size}
+        with open(os.path.join(path, "coords.json.tmp"), "w") as file:
+            json.dump(coords, file)
+        os.replace(os.path.join(path, "coords.json.tmp"), os.path.join(path, "coords.json"))
+        return cls(path)
+
+    @property
+    def times(self):
+        return pd.date_range(self.start, periods=self.n_times, freq=self.freq)
+
+    def _chunk(self, k):
+        if k not in self._chunks:
+            self._chunks[k] = np.load(self._chunk_file(self.path, k), mmap_mode="r")
+        return self._chunks[k]
+
+    def _time_bounds(self, start, end):
+        step = pd.Timedelta(pd.tseries.frequencies.to_offset(self.freq))
+        first = 0 if start is None else max(0, -(-(pd.Timestamp(start) - self.start) // step))
+        last = self.n_times if end is None else min(self.n_times, (pd.Timestamp(end) - self.start) // step + 1)
+        return int(first), int(max(first, last))
+
+    def _indices(self, hexagones, variables):
+        hexagones = self.hexagones if hexagones is None else [hex_id for hex_id in hexagones if hex_id in self.hex_index]
+        hex_indices = slice(None) if hexagones is self.hexagones else np.array([self.hex_index[hex_id] for hex_id in hexagones], dtype=int)
+        variables = self.variables if variables is None else list(variables)
+        var_indices = slice(None) if variables is self.variables else np.array([self.variables.index(variable) for variable in variables], dtype=int)
+        return hexagones, hex_indices, variables, var_indices
+
+    def iter_blocks(self, hexagones=None, start=None, end=None, variables=None):
+        """
+        Parameters:
+            hexagones (list, optional): hexagones lus (par défaut tous ; les hexagones absents du cube sont ignorés)
+            start, end (str ou Timestamp, optional): bornes (incluses) de la période lue
+            variables (list, optional): variables lues (par défaut toutes)
+
+        Returns:
+            générateur de tuples (dates (pd.DatetimeIndex), tableau float32 (n_hex, n_dates, n_var)), un par fichier touché
+        """
+        _, hex_indices, _, var_indices = self._indices(hexagones, variables)
+        first, last = self._time_bounds(start, end)
+        times = self.times
+        for k in range(first // self.chunk_size, -(-last // self.chunk_size)):
+            lower, upper = max(first, k * self.chunk_size), min(last, (k + 1) * self.chunk_size)
+            block = self._chunk(k)[:, lower - k * self.chunk_size:upper - k * self.chunk_size]
+            yield times[lower:upper], np.asarray(block[hex_indices][:, :, var_indices])
+
+    def read(self, hexagones=None, start=None, end=None, variables=None):
+        """
+        Returns:
+            tuple: (hexagones, dates (pd.DatetimeIndex), tableau float32 (n_hex, n_dates, n_var)) cf iter_blocks
+        """
+        hexagones, _, variables, _ = self._indices(hexagones, variables)
+        blocks = list(self.iter_blocks(hexagones, start, end, variables))
+        if not blocks:
+            return hexagones, pd.DatetimeIndex([]), np.empty((len(hexagones), 0, len(variables)), dtype=np.float32)
+        return hexagones, blocks[0][0].append([times for times, _ in blocks[1:]]), np.concatenate([block for _, block in blocks], axis=1)
+
+    def to_frame(self, hexagones=None, start=None, end=None, variables=None, hex_column="h3_hex_id", time_column="date"):
+        """
+        Lit un sous-cube au format long (hexagones dans l'ordre demandé, puis dates). Les pas de temps sans aucune valeur sont omis.
+
+        Returns:
+            pd.DataFrame: colonnes hex_column, time_column puis les variables (float32)
+        """
+        hexagones, times, array = self.read(hexagones, start, end, variables)
+        variables = self.variables if variables is None else list(variables)
+        values = array.reshape(-1, len(variables))
+        observed = ~np.all(np.isnan(values), axis=1)
+        frame = pd.DataFrame(values[observed], columns=variables)
+        frame.insert(0, time_column, np.tile(times.to_numpy(), len(hexagones))[observed])
+        frame.insert(0, hex_column, np.repeat(np.array(hexagones, dtype=object), len(times))[observed])
+        return frame
@@ -1,4 +1,6 @@
 import pandas as pd
+from scripts.processor.cube import HexTimeCube
+from scripts.profiling import stage
 class FeaturesConstructor:   
     """
     Classe DataTransformer pour transformer les données météorologiques par jour pour chaque hexagone H3.
@@ -74,6 +76,40 @@ class FeaturesConstructor:
         return aggregate_data
     
 
+    def add_donor_precipitation(self, aggregated_data, donors, test_days=7):
+        """
+        Remplace les précipitations des voisins géométriques (h3_hex_id_neighbor_i_precip_mean) par celles des hexagones
+        donneurs les plus corrélés (cf SpatialCrossCorrelation.top_k_donors). Comme pour les voisins, une valeur manquante
+        du donneur est remplacée par la précipitation de l'hexagone lui-même.
+
+        Parameters:
+        - aggregated_data (pandas.DataFrame): les données agrégées par jour
+        - donors (pandas.DataFrame ou int): index des donneurs (colonnes h3_hex_id, rank, donor_hex_id), ou nombre de donneurs
+          par hexagone : l'index est alors construit à partir des corrélations de la seule période d'entraînement
+          (les test_days derniers jours, période de test de MLDataSet, sont exclus). Un index fourni doit lui aussi avoir
+          été calculé sans la période de test (SpatialCrossCorrelation.fit(..., train_end=...)).
+        - test_days (int): nombre de jours de la période de test exclus du calcul des corrélations
+
+        Returns:
+        - aggregated_data (pandas.DataFrame): les données avec une colonne donor_<rang>_precip_mean par rang
+        """
+        if isinstance(donors, int):
+            from scripts.processor.spatial import SpatialCrossCorrelation
+
+            train_end = pd.to_datetime(aggregated_data['date']).max() - pd.DateOffset(days=test_days)
+            donors = SpatialCrossCorrelation().fit(aggregated_data, self.y, train_end=train_end).top_k_donors(donors)
+        precipitation = aggregated_data[['h3_hex_id', 'date', self.y]]
+        neighbor_columns = [col for col in aggregated_data.columns if col.startswith('h3_hex_id_neighbor_')]
+        data = aggregated_data.drop(columns=neighbor_columns)
+        for rank, donors_rank in donors.groupby('rank'):
+            column = f"donor_{rank}_precip_mean"
+            data['donor_hex_id'] = data['h3_hex_id'].map(donors_rank.set_index('h3_hex_id')['donor_hex_id'])
+            data = data.merge(precipitation.rename(columns={'h3_hex_id': 'donor_hex_id', self.y: column}), on=['donor_hex_id', 'date'], how='left')
+            data[column] = data[column].fillna(data[self.y])
+        data = data.drop(columns=['donor_hex_id'])
+        self.features = [col for col in data.columns.tolist() if (col != "h3_hex_id") and (col !="date") and (col!="precip_mean")]
+        return data
+
     def compute_var_lagged(self,df,nb_lag_var,nb_lag_exo):
 
         """
@@ -100,21 +136,50 @@ class FeaturesConstructor:
         return pd.concat([df_lags_y,df_lags_exo,df_others],axis=1)
     
 
-    def run(self, data, post_ts=True, nb_lag_var=1, nb_lag_exo=1):
+    def run(self, data, post_ts=True, nb_lag_var=1, nb_lag_exo=1, donors=None):
         """Pipeline qui lance l'ensemble des différentes étapes d'agrégation +features issus de l'analyse en séries temporelles si post_ts est True
 
         Args:
-            data (pd.DataFrame): les données à agréger
+            data (pd.DataFrame ou HexTimeCube): les données à agréger (un cube est lu entièrement ; pour un sous-ensemble, passer cube.to_frame(hexagones, start, end))
             post_ts (bool, optional): features issus de l'étude séries temporelles (indicatrices mois/saison, variables retardées). Defaults to True.
             nb_lag_var (int, optional): nombre de lags pour y. 
             nb_lag_exo (int, optional): nombre de lags pour variables exogènes
+            donors (pd.DataFrame ou int, optional): index des hexagones donneurs (SpatialCrossCorrelation.top_k_donors) remplaçant les voisins géométriques,
+                ou nombre de donneurs choisis sur la période d'entraînement (cf add_donor_precipitation)
+
+        Returns:
+            processed_data: DataFrame processé
+        """
+        if isinstance(data, HexTimeCube):
+            with stage("features.read_cube") as step:
+                data = data.to_frame()
+                step.rows_out = len(data)
+        with stage("features.aggregate_data_by_day", rows_in=len(data)) as step:
+            aggregated_data = self.aggregate_data_by_day(data)
+            step.rows_out = len(aggregated_data)
+        if donors is not None:
+            with stage("features.add_donor_precipitation", rows_in=len(aggregated_data)):
+                aggregated_data = self.add_donor_precipitation(aggregated_data, donors)
+        with stage("features.build_features", rows_in=len(aggregated_data)) as step:
+            processed_data = self.build_features(aggregated_data, post_ts, nb_lag_var, nb_lag_exo)
+            step.rows_out = len(processed_data)
+        return processed_data
+
+    def build_features(self, aggregated_data, post_ts=True, nb_lag_var=1, nb_lag_exo=1):
+        """Construit les features à partir de données déjà agrégées par jour (sortie de aggregate_data_by_day),
+        ce qui permet de réutiliser une même agrégation pour plusieurs nombres de lags.
+
+        Args:
+            aggregated_data (pd.DataFrame): les données agrégées par jour (non modifiées)
+            post_ts (bool, optional): features issus de l'étude séries temporelles (indicatrices mois/saison, variables retardées). Defaults to True.
+            nb_lag_var (int, optional): nombre de lags pour y.
+            nb_lag_exo (int, optional): nombre de lags pour variables exogènes
 
         Returns:
             processed_data: DataFrame processé
         """
-        aggregated_data = self.aggregate_data_by_day(data)
         if post_ts is True:
-            transformed_data = self.create_saison_month_columns(aggregated_data)
+            transformed_data = self.create_saison_month_columns(aggregated_data.copy())
             lagged_data = self.compute_var_lagged(transformed_data, nb_lag_var, nb_lag_exo)
             lagged_data.drop(self.features, axis=1, inplace=True)
             lagged_data.dropna(inplace=True)
@@ -125,5 +190,3 @@ class FeaturesConstructor:
             self.instances = [feature for feature in self.processed_data.columns.tolist() if (feature != self.y) and (feature !="date") and (feature !="h3_hex_id")]
 
         return self.processed_data
-    
-  
\ No newline at end of file
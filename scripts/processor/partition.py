@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+class HexPartitionedData:
+    """
+    Classe HexPartitionedData : vue des données partitionnées par hexagone, construite avec un seul tri et une seule passe.
+    Les lignes sont triées par (hexagone, date) et chaque hexagone correspond à une tranche contiguë [start, stop[ :
+    l'accès aux données d'un hexagone est un simple découpage (vue sans copie), au lieu d'un filtre booléen
+    data[data['h3_hex_id'] == hex] qui parcourt toute la colonne à chaque hexagone.
+
+    Attributs:
+        data (pd.DataFrame): Données triées par hexagone puis par date (index d'origine conservé)
+        hex_column (str): Nom de la colonne des hexagones
+        time_column (str): Nom de la colonne des dates
+        hexagones (list): Hexagones présents, dans l'ordre de tri
+        offsets (np.ndarray): Bornes des tranches : l'hexagone i occupe les lignes offsets[i]:offsets[i+1]
+
+    Methods:
+        get(hex_id): Renvoie les lignes d'un hexagone (DataFrame, vue)
+        values(column, hex_id): Renvoie les valeurs d'une colonne pour un hexagone (np.ndarray, vue)
+        block(hex_id, columns): Renvoie un bloc NumPy (n_lignes, n_colonnes) pour un hexagone (vue)
+        items(): Itère sur les couples (hexagone, DataFrame)
+        to_dense(column): Renvoie un tableau dense (n_hex, n_dates) d'une colonne, NaN pour les dates manquantes
+        subset(hexagones): Renvoie une partition restreinte à certains hexagones
+        chunks(n_chunks, chunk_size): Découpe la partition en sous-partitions contiguës (picklables) pour un pool de processus
+    """
+
+    def __init__(self, data, hex_column="h3_hex_id", time_column="date"):
+        self.time_column = time_column
+        codes, uniques = pd.factorize(data[hex_column], sort=True)
+        if (codes < 0).any():
+            data, codes = data[codes >= 0], codes[codes >= 0]
+        if time_column in data.columns:
+            order = np.lexsort((data[time_column].to_numpy(), codes))
+        else:
+            order = np.argsort(codes, kind="stable")
+        counts = np.bincount(codes, minlength=len(uniques))
+        self._set(data.iloc[order], hex_column, list(uniques), np.concatenate([[0], np.cumsum(counts)]))
+
+    @classmethod
+    def _from_sorted(cls, data, hex_column, hexagones, offsets, time_column="date"):
+        partition = cls.__new__(cls)
+        partition.time_column = time_column
+        partition._set(data, hex_column, hexagones, offsets)
+        return partition
+
+    def _set(self, data, hex_column, hexagones, offsets):
+        self.data = data
+        self.hex_column = hex_column
+        self.hexagones = hexagones
+        self.offsets = offsets
+        self.hex_index = {hex_id: i for i, hex_id in enumerate(hexagones)}
+        self._columns = {}
+        self._blocks = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_columns"], state["_blocks"] = {}, {}
+        return state
+
+    def __len__(self):
+        return len(self.hexagones)
+
+    def __iter__(self):
+        return iter(self.hexagones)
+
+    def __contains__(self, hex_id):
+        return hex_id in self.hex_index
+
+    def bounds(self, hex_id):
+        i = self.hex_index[hex_id]
+        return self.offsets[i], self.offsets[i + 1]
+
+    def get(self, hex_id):
+        start, stop = self.bounds(hex_id)
+        return self.data.iloc[start:stop]
+
+    def column(self, column):
+        if column not in self._columns:
+            self._columns[column] = self.data[column].to_numpy()
+        return self._columns[column]
+
+    def values(self, column, hex_id):
+        start, stop = self.bounds(hex_id)
+        return self.column(column)[start:stop]
+
+    def block(self, hex_id, columns):
+        columns = tuple(columns)
+        if columns not in self._blocks:
+            self._blocks[columns] = self.data[list(columns)].to_numpy()
+        start, stop = self.bounds(hex_id)
+        return self._blocks[columns][start:stop]
+
+    def to_dense(self, column, dtype=float):
+        """
+        Construit en une passe le tableau dense (n_hex, n_dates) d'une colonne.
+
+        Parameters:
+            column (str): Colonne à extraire
+            dtype: Type des valeurs (float64 par défaut)
+
+        Returns:
+            tuple: (hexagones, dates (pd.DatetimeIndex), tableau (n_hex, n_dates) avec NaN pour les dates absentes)
+        """
+        date_codes, dates = pd.factorize(pd.to_datetime(self.data[self.time_column]), sort=True)
+        dense = np.full((len(self), len(dates)), np.nan, dtype=dtype)
+        dense[np.repeat(np.arange(len(self)), np.diff(self.offsets)), date_codes] = self.column(column)
+        return self.hexagones, pd.DatetimeIndex(dates), dense
+
+    def items(self):
+        for hex_id in self.hexagones:
+            yield hex_id, self.get(hex_id)
+
+    def subset(self, hexagones):
+        """
+        Parameters:
+            hexagones (list): Hexagones à conserver
+
+        Returns:
+            HexPartitionedData: partition restreinte (les tranches sont concaténées dans l'ordre de la partition)
+        """
+        hexagones = set(hexagones)
+        kept = [hex_id for hex_id in self.hexagones if hex_id in hexagones]
+        positions = np.concatenate([np.arange(*self.bounds(hex_id)) for hex_id in kept]) if kept else np.array([], dtype=int)
+        counts = [self.bounds(hex_id)[1] - self.bounds(hex_id)[0] for hex_id in kept]
+        return self._from_sorted(self.data.iloc[positions], self.hex_column, kept, np.concatenate([[0], np.cumsum(counts)]).astype(int), self.time_column)
+
+    def chunks(self, n_chunks=None, chunk_size=None):
+        """
+        Découpe la partition en sous-partitions de hexagones consécutifs, chacune ne transportant que ses propres lignes
+        lorsqu'elle est envoyée à un processus du pool.
+
+        Parameters:
+            n_chunks (int, optional): Nombre de sous-partitions
+            chunk_size (int, optional): Nombre d'hexagones par sous-partition (prioritaire sur n_chunks)
+
+        Returns:
+            list: Liste de HexPartitionedData
+        """
+        if chunk_size is None:
+            chunk_size = max(1, int(np.ceil(len(self) / (n_chunks or 1))))
+        chunks = []
+        for first in range(0, len(self), chunk_size):
+            last = min(first + chunk_size, len(self))
+            start, stop = self.offsets[first], self.offsets[last]
+            chunks.append(self._from_sorted(self.data.iloc[start:stop], self.hex_column, self.hexagones[first:last], self.offsets[first:last + 1] - start, self.time_column))
+        return chunks
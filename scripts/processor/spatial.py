@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+from scripts.processor.partition import HexPartitionedData
+
+class SpatialCrossCorrelation:
+    """
+    Classe SpatialCrossCorrelation pour calculer la matrice de corrélation croisée hexagone × hexagone (éventuellement retardée)
+    des précipitations journalières, à partir du tableau dense (n_hex, n_jours).
+
+    Les séries sont standardisées une fois (valeurs manquantes mises à zéro après standardisation), puis la matrice est calculée
+    par blocs de lignes en multiplication matricielle float32 : la taille des blocs est choisie pour que tous les tableaux
+    temporaires d'un bloc (produits, nombres de jours communs, masque, et ceux de top_k_donors) respectent un plafond mémoire,
+    et l'index des k hexagones « donneurs » les plus corrélés est construit bloc par bloc sans jamais matérialiser la matrice
+    entière. Chaque corrélation est normalisée par le nombre de jours observés en commun (lui aussi calculé par blocs).
+
+    corr[i, j] = corrélation entre la série de l'hexagone i au jour t et celle de l'hexagone j au jour t - lag.
+
+    Attributs:
+        lag (int): Retard (en jours) appliqué aux hexagones donneurs
+        memory_limit_mb (float): Plafond mémoire des blocs de calcul (en Mo)
+        min_periods (int): Nombre minimal de jours communs pour qu'une corrélation soit calculée
+        hexagones (list): Hexagones (ordre des lignes/colonnes)
+        dates (pd.DatetimeIndex): Dates du tableau dense
+
+    Methods:
+        fit(data, variable, train_end): Standardise les séries d'une variable (jusqu'à train_end)
+        fit_array(hexagones, array): Standardise un tableau dense déjà construit
+        blocks(extra_bytes): Itère sur les blocs de lignes de la matrice de corrélation
+        matrix(filename): Matrice complète (en mémoire, ou np.memmap si filename est fourni)
+        top_k_donors(k, exclude_self): Index des k hexagones donneurs les plus corrélés à chaque hexagone
+    """
+
+    def __init__(self, lag=1, memory_limit_mb=256, min_periods=30):
+        self.lag = lag
+        self.memory_limit_mb = memory_limit_mb
+        self.min_periods = min_periods
+
+    def fit(self, data, variable="precip_mean", train_end=None):
+        """
+        Parameters:
+            data (pd.DataFrame ou HexPartitionedData): données journalières contenant h3_hex_id, date et la variable
+            variable (str): variable étudiée
+            train_end (str ou Timestamp, optional): dernière date prise en compte, pour que les corrélations (et donc le choix
+                des donneurs utilisés comme features) ne dépendent pas de la période de test
+
+        Returns:
+            self
+        """
+        if not isinstance(data, HexPartitionedData):
+            data = HexPartitionedData(data)
+        hexagones, self.dates, dense = data.to_dense(variable)
+        if train_end is not None:
+            kept = self.dates <= pd.Timestamp(train_end)
+            self.dates, dense = self.dates[kept], dense[:, kept]
+        return self.fit_array(hexagones, dense)
+
+    def fit_array(self, hexagones, array):
+        self.hexagones = list(hexagones)
+        observed = ~np.isnan(array)
+        mean = np.nanmean(array, axis=1, keepdims=True)
+        std = np.nanstd(array, axis=1, keepdims=True)
+        std[~(std > 0)] = np.nan
+        standardized = np.nan_to_num((array - mean) / std).astype(np.float32)
+        observed = observed.astype(np.float32)
+        n_days = array.shape[1]
+        # cibles et donneurs sont des vues décalées des mêmes tableaux
+        self._targets = standardized[:, self.lag:]
+        self._donors = standardized[:, :n_days - self.lag]
+        self._targets_observed = observed[:, self.lag:]
+        self._donors_observed = observed[:, :n_days - self.lag]
+        return self
+
+    def block_size(self, extra_bytes=0):
+        """
+        Parameters:
+            extra_bytes (int): octets supplémentaires par valeur du bloc utilisés par l'appelant
+
+        Returns:
+            int: nombre de lignes par bloc : produits et nombres de jours communs (float32), masque (bool), bloc précédent
+            encore référencé par la boucle de l'appelant (float32) et extra_bytes par valeur, pour n_hex valeurs par ligne
+        """
+        bytes_per_row = len(self.hexagones) * (3 * np.dtype(np.float32).itemsize + np.dtype(bool).itemsize + extra_bytes)
+        return max(1, int(self.memory_limit_mb * 2 ** 20 // bytes_per_row))
+
+    def blocks(self, extra_bytes=0):
+        """
+        Itère sur les blocs de lignes de la matrice de corrélation (calcul en place : un bloc n'alloue que les produits,
+        les nombres de jours communs et un masque).
+
+        Parameters:
+            extra_bytes (int): octets par valeur du bloc utilisés par l'appelant en plus du bloc (cf block_size)
+
+        Returns:
+            générateur de tuples (début, fin, bloc float32 (fin - début, n_hex)), NaN si moins de min_periods jours communs
+        """
+        size = self.block_size(extra_bytes)
+        for start in range(0, len(self.hexagones), size):
+            stop = min(start + size, len(self.hexagones))
+            block = self._targets[start:stop] @ self._donors.T
+            counts = self._targets_observed[start:stop] @ self._donors_observed.T
+            enough = counts >= self.min_periods
+            np.divide(block, counts, out=block, where=enough)
+            np.copyto(block, np.nan, where=np.logical_not(enough, out=enough))
+            del counts, enough
+            yield start, stop, block
+
+    def matrix(self, filename=None):
+        """
+        Parameters:
+            filename (str, optional): fichier où écrire la matrice (np.memmap), pour les résolutions où elle ne tient pas en mémoire
+
+        Returns:
+            np.ndarray ou np.memmap: matrice (n_hex, n_hex) float32
+        """
+        shape = (len(self.hexagones), len(self.hexagones))
+        result = np.lib.format.open_memmap(filename, mode="w+", dtype=np.float32, shape=shape) if filename else np.empty(shape, dtype=np.float32)
+        for start, stop, block in self.blocks():
+            result[start:stop] = block
+        return result
+
+    def top_k_donors(self, k=3, exclude_self=True):
+        """
+        Construit l'index des k hexagones donneurs les plus corrélés (en valeur absolue, au retard lag) à chaque hexagone.
+
+        Parameters:
+            k (int): nombre de donneurs par hexagone
+            exclude_self (bool): exclut l'hexagone lui-même des donneurs
+
+        Returns:
+            pd.DataFrame: colonnes h3_hex_id, rank (0 = meilleur donneur), donor_hex_id, correlation
+        """
+        hexagones = np.array(self.hexagones, dtype=object)
+        k = min(k, len(hexagones) - int(exclude_self))
+        rows = []
+        # scores (float32) et indices de np.argpartition (int64) par valeur du bloc
+        extra_bytes = np.dtype(np.float32).itemsize + np.dtype(np.int64).itemsize
+        for start, stop, block in self.blocks(extra_bytes):
+            if exclude_self:
+                # corrélation de l'hexagone avec lui-même mise à NaN : si moins de k donneurs sont valides, l'hexagone
+                # peut être sélectionné parmi les scores infinis, puis est écarté avec les corrélations manquantes
+                block[np.arange(stop - start), np.arange(start, stop)] = np.nan
+            # scores = -|corr| (NaN en dernier), pour trier par ordre croissant
+            scores = np.abs(block)
+            np.negative(scores, out=scores)
+            np.nan_to_num(scores, copy=False, nan=np.inf)
+            best = np.argpartition(scores, k - 1, axis=1)[:, :k].copy()
+            best = np.take_along_axis(best, np.argsort(np.take_along_axis(scores, best, axis=1), axis=1), axis=1)
+            del scores
+            correlations = np.take_along_axis(block, best, axis=1)
+            rows.append(pd.DataFrame({
+                "h3_hex_id": np.repeat(hexagones[start:stop], k),
+                "rank": np.tile(np.arange(k), stop - start),
+                "donor_hex_id": hexagones[best.ravel()],
+                "correlation": correlations.ravel(),
+            }))
+        donors = pd.concat(rows, ignore_index=True)
+        return donors[donors["correlation"].notna()].reset_index(drop=True)
@@ -0,0 +1,241 @@
+import atexit
+import json
+import os
+import threading
+import time
+import tracemalloc
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_active = None
+
+
+class _NullStage:
+    """
+    Étape inactive renvoyée par stage() lorsque le profilage est désactivé : une seule instance partagée, sans aucune mesure.
+    Les attributs renseignés dans le bloc with sont ignorés, et args renvoie un dictionnaire neuf à chaque accès.
+    """
+
+    @property
+    def args(self):
+        return {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return float("nan")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Stage:
+    """
+    Mesure d'une étape du pipeline (cf Profiler.stage) : durée, pic mémoire Python (tracemalloc) pendant l'étape,
+    pic de RSS du processus en fin d'étape, lignes en entrée et en sortie.
+    rows_out (et tout autre attribut de args) peut être renseigné dans le bloc with.
+    """
+
+    def __init__(self, profiler, name, rows_in=None, **args):
+        self.profiler = profiler
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.args = args
+        self.child_peak = 0
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        if self.profiler.trace_memory:
+            self.memory_start, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            if hasattr(tracemalloc, "reset_peak"):  # Python >= 3.9 ; sinon le pic est celui depuis le début du profilage
+                tracemalloc.reset_peak()
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.duration = time.perf_counter() - self.start
+        stack = self.profiler._stack()
+        stack.pop()
+        peak = 0
+        if self.profiler.trace_memory:
+            # reset_peak est global : le pic d'une étape englobante est reconstitué à partir des pics relevés avant et pendant ses sous-étapes
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            self.memory_peak_mb = (peak - self.memory_start) / 2 ** 20
+        else:
+            self.memory_peak_mb = float("nan")
+        if stack:
+            stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        self.rss_peak_mb = _peak_rss_mb()
+        self.profiler._record(self, depth=len(stack))
+        return False
+
+
+class Profiler:
+    """
+    Classe Profiler : instrumentation des étapes du pipeline (chargement, indexation H3, features, entraînement par hexagone).
+
+    Le profilage est activé par le gestionnaire de contexte (with Profiler(...):) ou par la variable d'environnement
+    METEO_PROFILE=<fichier trace> (écriture de la trace et affichage du résumé à la fin du programme). Les modules
+    instrumentés appellent la fonction stage(), qui renvoie une étape inactive partagée lorsqu'aucun profileur n'est actif :
+    le coût est alors un simple test. Seul le processus principal est tracé (pas les processus des pools).
+
+    Attributs:
+        output (str): Fichier de trace JSON au format Chrome (chrome://tracing, Perfetto), None pour ne pas l'écrire
+        trace_memory (bool): Mesure des pics mémoire Python par tracemalloc (ralentit les allocations)
+        records (list): Mesures des étapes terminées
+
+    Methods:
+        stage(name, rows_in, **args): Gestionnaire de contexte mesurant une étape
+        summary(): Tableau récapitulatif par étape
+        hot_hexes(n, name): Hexagones les plus lents
+        write_trace(filename): Écrit la trace JSON
+    """
+
+    def __init__(self, output="profiles/trace.json", trace_memory=True):
+        self.output = output
+        self.trace_memory = trace_memory
+        self.records = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _record(self, stage, depth):
+        record = {
+            "name": stage.name,
+            "start": stage.start - self._origin,
+            "duration": stage.duration,
+            "depth": depth,
+            "thread": threading.get_ident(),
+            "rows_in": stage.rows_in,
+            "rows_out": stage.rows_out,
+            "memory_peak_mb": stage.memory_peak_mb,
+            "rss_peak_mb": stage.rss_peak_mb,
+        }
+        record.update(stage.args)
+        with self._lock:
+            self.records.append(record)
+
+    def __enter__(self):
+        global _active
+        self._previous = _active
+        self._started_tracemalloc = self.trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start()
+        _active = self
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._previous
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        if self.output:
+            self.write_trace()
+        if self.records:
+            print(self.summary().to_string())
+        return False
+
+    def stage(self, name, rows_in=None, **args):
+        return Stage(self, name, rows_in, **args)
+
+    def summary(self):
+        """
+        Returns:
+            pd.DataFrame: une ligne par étape (triée par temps total) : nombre d'appels, temps total/moyen/max (s),
+            lignes en entrée/sortie cumulées, pic mémoire Python max et pic de RSS max (Mo)
+        """
+        records = pd.DataFrame(self.records)
+        if records.empty:
+            return records
+        records[["rows_in", "rows_out"]] = records[["rows_in", "rows_out"]].apply(pd.to_numeric)
+        summary = records.groupby("name").agg(
+            calls=("duration", "size"),
+            total_s=("duration", "sum"),
+            mean_s=("duration", "mean"),
+            max_s=("duration", "max"),
+            rows_in=("rows_in", lambda rows: rows.sum(min_count=1)),
+            rows_out=("rows_out", lambda rows: rows.sum(min_count=1)),
+            memory_peak_mb=("memory_peak_mb", "max"),
+            rss_peak_mb=("rss_peak_mb", "max"),
+        )
+        return summary.sort_values("total_s", ascending=False)
+
+    def hot_hexes(self, n=10, name=None):
+        """
+        Parameters:
+            n (int): Nombre d'hexagones renvoyés
+            name (str, optional): Étape considérée (par défaut toutes les étapes mesurées par hexagone)
+
+        Returns:
+            pd.DataFrame: les n mesures (étape, hexagone) les plus longues
+        """
+        records = pd.DataFrame(self.records)
+        if "hex_id" not in records:
+            return records.iloc[0:0]
+        records = records[records["hex_id"].notna()]
+        if name is not None:
+            records = records[records["name"] == name]
+        return records.nlargest(n, "duration")[["name", "hex_id", "duration", "rows_in", "memory_peak_mb"]]
+
+    def write_trace(self, filename=None):
+        """
+        Écrit les mesures au format Chrome trace (événements complets 'X', temps en microsecondes).
+        """
+        filename = filename or self.output
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        events = []
+        for record in self.records:
+            args = {key: value for key, value in record.items() if key not in ("name", "start", "duration", "depth", "thread") and value is not None and value == value}
+            events.append({"name": record["name"], "cat": "stage", "ph": "X", "pid": os.getpid(), "tid": record["thread"],
+                           "ts": record["start"] * 1e6, "dur": record["duration"] * 1e6, "args": args})
+        with open(filename, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file, default=str)
+
+
+def stage(name, rows_in=None, **args):
+    """
+    Mesure une étape si un profileur est actif (sinon étape inactive partagée).
+
+    Exemple:
+        with stage("features.aggregate", rows_in=len(data)) as step:
+            grouped = ...
+            step.rows_out = len(grouped)
+    """
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name, rows_in, **args)
+
+
+def active_profiler():
+    return _active
+
+
+if os.environ.get("METEO_PROFILE"):
+    _env_profiler = Profiler(os.environ["METEO_PROFILE"], trace_memory=os.environ.get("METEO_PROFILE_MEMORY", "1") != "0")
+    _env_profiler.__enter__()
+    atexit.register(_env_profiler.__exit__, None, None, None)
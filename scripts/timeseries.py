@@ -1,5 +1,10 @@
-from statsmodels.tsa.stattools import kpss, adfuller
+from concurrent.futures import ProcessPoolExecutor
+import warnings
+from scipy.special import ndtr
+import numpy as np
 import pandas as pd
+from scripts.cache import PickleCache, fingerprint
+from scripts.processor.partition import HexPartitionedData
 
 class TestsStationarite:
     """
@@ -20,6 +25,8 @@ class TestsStationarite:
         Retourne :
         - results (pd.DataFrame) : DataFrame contenant les résultats du test KPSS pour chaque colonne
         """
+        from statsmodels.tsa.stattools import kpss
+
         results = pd.DataFrame(columns=['Test', 'Variable', 'Regression', 'Test Statistic', 'p-value', 'Lags Used', 'Résultat'])
 
         for col in self.df.columns:
@@ -43,6 +50,8 @@ class TestsStationarite:
         Returns :
         - results (pd.DataFrame) : DataFrame contenant les résultats du test ADF pour chaque colonne
         """
+        from statsmodels.tsa.stattools import adfuller
+
         results = pd.DataFrame(columns=['Test', 'Variable', 'Regression', 'Test Statistic', 'p-value', 'Lags Used', 'Résultat'])
 
         for col in self.df.columns:
@@ -89,22 +98,305 @@ class TestsStationarite:
         return results_of_tests
    
     
-def get_stationarity_results(data_for_time_series):
+def _run_stationarity_tests(series, regression_kpss, regression_adf, alpha):
     """
-    Calcule les résultats des tests de stationnarité (KPSS et ADF) pour chaque h3_hex_id unique dans le DataFrame fourni.
+    Effectue les tests KPSS et ADF sur une liste de séries (exécuté dans un processus du pool).
+
+    Retourne :
+    - results (np.ndarray) : tableau (n_series, 2, 4) : pour KPSS puis ADF, (statistique, p-value, lags, stationnaire)
+    """
+    from statsmodels.tsa.stattools import kpss, adfuller
+
+    results = np.full((len(series), 2, 4), np.nan)
+    level = float(alpha.rstrip('%')) / 100
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for i, values in enumerate(series):
+            values = values[~np.isnan(values)]
+            try:
+                kpss_result = kpss(values, regression=regression_kpss)
+                results[i, 0] = kpss_result[0], kpss_result[1], kpss_result[2], kpss_result[0] < kpss_result[3][alpha]
+            except (ValueError, np.linalg.LinAlgError, ZeroDivisionError):
+                pass
+            try:
+                adf_result = adfuller(values, regression=regression_adf)
+                results[i, 1] = adf_result[0], adf_result[1], adf_result[2], adf_result[1] < level
+            except (ValueError, np.linalg.LinAlgError, ZeroDivisionError):
+                pass
+    return results
+
+
+class StationarityBattery:
+    """
+    Classe qui effectue les tests de stationnarité KPSS et ADF pour tous les couples (hexagone, variable), en parallèle.
+
+    Les séries sont envoyées par paquets à un pool de processus, les statistiques sont rangées dans des tableaux préalloués
+    et le résultat est un unique DataFrame (une ligne par hexagone, variable et test). Les résultats sont mis en cache
+    par empreinte de la série et des paramètres des tests : relancer le diagnostic ne recalcule que les séries modifiées.
+
+    Attributs :
+    - regression_kpss (str) : Type de régression du test KPSS ('c' ou 'ct')
+    - regression_adf (str) : Type de régression du test ADF ('c', 'ct', 'ctt' ou 'n')
+    - alpha (str) : Seuil de significativité (ex: '5%')
+    - n_jobs (int) : Nombre de processus du pool (None : nombre de CPU, 1 : pas de pool)
+    - chunk_size (int) : Nombre de séries envoyées à un processus en une fois
+    - cache (dict) : Résultats déjà calculés, par empreinte de série
+    - disk_cache (PickleCache) : Cache disque optionnel des résultats
+    """
+
+    def __init__(self, regression_kpss='c', regression_adf='n', alpha='5%', n_jobs=None, chunk_size=64, cache_dir=None):
+        self.regression_kpss = regression_kpss
+        self.regression_adf = regression_adf
+        self.alpha = alpha
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
+        self.cache = {}
+        self.disk_cache = PickleCache(cache_dir) if cache_dir else None
+
+    def _lookup(self, key):
+        if key not in self.cache and self.disk_cache is not None:
+            cached = self.disk_cache.get(key)
+            if cached is not None:
+                self.cache[key] = cached
+        return self.cache.get(key)
+
+    def run(self, data, variables=None, hexagones=None):
+        """
+        Effectue les tests pour chaque couple (hexagone, variable).
+
+        Paramètres :
+        - data (pd.DataFrame ou HexPartitionedData) : données de séries temporelles (colonnes h3_hex_id, date et variables)
+        - variables (list) : variables à tester (par défaut toutes les colonnes numériques)
+        - hexagones (list) : hexagones à tester (par défaut tous)
+
+        Retourne :
+        - results (pd.DataFrame) : colonnes h3_hex_id, Test, Variable, Regression, Test Statistic, p-value, Lags Used, Résultat
+        """
+        if not isinstance(data, HexPartitionedData):
+            data = HexPartitionedData(data)
+        if variables is None:
+            variables = [col for col in data.data.select_dtypes('number').columns if col not in (data.hex_column, 'date')]
+        hexagones = data.hexagones if hexagones is None else [hex_id for hex_id in hexagones if hex_id in data]
+
+        pairs = [(hex_id, variable) for hex_id in hexagones for variable in variables]
+        results = np.full((len(pairs), 2, 4), np.nan)
+        params = (self.regression_kpss, self.regression_adf, self.alpha)
+        keys, pending = [], []
+        for i, (hex_id, variable) in enumerate(pairs):
+            values = data.values(variable, hex_id).astype(float)
+            keys.append(fingerprint(values, params))
+            cached = self._lookup(keys[i])
+            if cached is None:
+                pending.append((i, values))
+            else:
+                results[i] = cached
+
+        chunks = [pending[start:start + self.chunk_size] for start in range(0, len(pending), self.chunk_size)]
+        batches = [[values for _, values in chunk] for chunk in chunks]
+        if self.n_jobs == 1:
+            outputs = [_run_stationarity_tests(batch, *params) for batch in batches]
+        else:
+            with ProcessPoolExecutor(self.n_jobs) as executor:
+                outputs = list(executor.map(_run_stationarity_tests, batches, *[[param] * len(batches) for param in params]))
+        for chunk, output in zip(chunks, outputs):
+            for (i, _), result in zip(chunk, output):
+                results[i] = result
+                self.cache[keys[i]] = result
+                if self.disk_cache is not None:
+                    self.disk_cache.set(keys[i], result)
+
+        n_pairs = len(pairs)
+        stationary = np.where(np.isnan(results[:, :, 3]), np.nan, results[:, :, 3] == 1).ravel()
+        return pd.DataFrame({
+            'h3_hex_id': np.repeat([hex_id for hex_id, _ in pairs], 2),
+            'Test': np.tile(['KPSS', 'ADF'], n_pairs),
+            'Variable': np.repeat([variable for _, variable in pairs], 2),
+            'Regression': np.tile([self.regression_kpss, self.regression_adf], n_pairs),
+            'Test Statistic': results[:, :, 0].ravel(),
+            'p-value': results[:, :, 1].ravel(),
+            'Lags Used': results[:, :, 2].ravel(),
+            'Résultat': pd.Series(stationary).map({1.0: 'Stationnaire', 0.0: 'Non Stationnaire'}).to_numpy(),
+        })
+
+
+def mackinnonp_batch(teststats, regression='c'):
+    """
+    Version vectorisée de statsmodels.tsa.adfvalues.mackinnonp (N=1) : p-values approchées de MacKinnon (1994)
+    calculées avec les mêmes tables que statsmodels.
 
     Paramètres :
-    - data_for_time_series (pd.DataFrame) : DataFrame contenant les données de séries temporelles pour lesquelles les tests de stationnarité doivent être effectués.
+    - teststats (np.ndarray) : statistiques ADF
+    - regression (str) : 'c', 'n', 'ct' ou 'ctt'
 
     Retourne :
-    - stationarity_hex (pd.DataFrame) : DataFrame contenant les résultats des tests de stationnarité pour chaque h3_hex_id unique.
+    - pvalues (np.ndarray) : p-values de même forme que teststats
+    """
+    from statsmodels.tsa.adfvalues import _tau_maxs, _tau_mins, _tau_stars, _tau_smallps, _tau_largeps
+
+    teststats = np.asarray(teststats, dtype=float)
+    small = np.polyval(_tau_smallps[regression][0][::-1], teststats)
+    large = np.polyval(_tau_largeps[regression][0][::-1], teststats)
+    pvalues = ndtr(np.where(teststats <= _tau_stars[regression][0], small, large))
+    pvalues = np.where(teststats > _tau_maxs[regression][0], 1.0, pvalues)
+    return np.where(teststats < _tau_mins[regression][0], 0.0, pvalues)
+
+
+class ADFScreening:
+    """
+    Classe qui effectue un criblage rapide par test ADF de milliers de séries à la fois.
+
+    Pour un nombre de lags fixé, la régression de Dickey-Fuller augmentée de toutes les séries de même longueur est résolue
+    comme un unique problème de moindres carrés par lots (QR sur un tableau (n_series, nobs, p)), et les statistiques
+    sont converties en p-values avec les tables de MacKinnon utilisées par statsmodels : les résultats coïncident avec
+    adfuller(..., maxlag=lags, autolag=None). Seules les séries dont la p-value est proche du seuil (cas limites) repassent
+    par adfuller avec sélection automatique des lags.
+
+    Attributs :
+    - regression (str) : Type de régression ('c', 'ct', 'ctt' ou 'n')
+    - lags (int) : Nombre de lags de la régression (None : règle de Schwert utilisée par adfuller)
+    - alpha (float) : Seuil de significativité
+    - margin (float) : Demi-largeur de la bande de p-values considérées comme limites autour de alpha
+    - autolag (str) : Critère de sélection des lags pour les cas limites ('AIC', 'BIC', 't-stat')
+    - block_size (int) : Nombre de séries résolues simultanément (borne la mémoire)
     """
-    stationarity_hex = pd.DataFrame()
-    for hex in data_for_time_series['h3_hex_id'].unique():
-        serie = pd.DataFrame(data_for_time_series[data_for_time_series['h3_hex_id'] == hex]['precip_mean'])
-        test_stationarite = TestsStationarite(serie)
-        serie_tests = test_stationarite.execute_tests('c', 'n', '5%')
-        stationarity_hex = pd.concat([stationarity_hex, serie_tests])
-    return stationarity_hex    
 
+    def __init__(self, regression='n', lags=None, alpha=0.05, margin=0.02, autolag='AIC', block_size=1024):
+        self.regression = regression
+        self.lags = lags
+        self.alpha = alpha
+        self.margin = margin
+        self.autolag = autolag
+        self.block_size = block_size
+
+    def _ntrend(self):
+        return len(self.regression) if self.regression != 'n' else 0
+
+    def _default_lags(self, n_days):
+        return min(n_days // 2 - self._ntrend() - 1, int(np.ceil(12.0 * np.power(n_days / 100.0, 1 / 4.0))))
+
+    def _lags(self, n_days, lags=None):
+        return lags if lags is not None else (self.lags if self.lags is not None else self._default_lags(n_days))
+
+    def _valid_lags(self, n_days, lags):
+        # au moins une observation de plus que de régresseurs (niveau retardé, lags différences, termes déterministes)
+        return lags >= 0 and n_days - 1 - lags > lags + 1 + self._ntrend()
+
+    def batch_adf(self, series, lags=None):
+        """
+        Calcule la statistique ADF pour un nombre de lags fixé sur un lot de séries de même longueur, sans valeur manquante.
+
+        Paramètres :
+        - series (np.ndarray) : tableau (n_series, n_days)
+        - lags (int) : nombre de lags (par défaut self.lags ou la règle de Schwert)
+
+        Retourne :
+        - results (dict) : 'stat', 'pvalue' (n_series,), 'lags', 'nobs' et 'critical_values' (dict '1%', '5%', '10%') ;
+          'stat' et 'pvalue' valent NaN pour les séries dégénérées (constantes ou régression de rang incomplet)
+        """
+        series = np.asarray(series, dtype=float)
+        n_series, n_days = series.shape
+        lags = self._lags(n_days, lags)
+        if not self._valid_lags(n_days, lags):
+            raise ValueError(f"{lags} lags : pas assez d'observations ({n_days} jours) pour la régression ADF")
+        nobs = n_days - 1 - lags
+        diffs = np.diff(series, axis=1)
+        trend = np.arange(1, nobs + 1, dtype=float)
+        deterministic = {'n': [], 'c': [np.ones(nobs)], 'ct': [np.ones(nobs), trend], 'ctt': [np.ones(nobs), trend, trend ** 2]}[self.regression]
+
+        stats = np.full(n_series, np.nan)
+        for start in range(0, n_series, self.block_size):
+            block, block_diffs = series[start:start + self.block_size], diffs[start:start + self.block_size]
+            columns = [block[:, lags:n_days - 1]] + [block_diffs[:, lags - j:lags - j + nobs] for j in range(1, lags + 1)]
+            columns += [np.broadcast_to(column, (len(block), nobs)) for column in deterministic]
+            X = np.stack(columns, axis=2)
+            y = block_diffs[:, lags:]
+            Q, R = np.linalg.qr(X)
+            # séries dégénérées (constantes, précipitations toujours nulles...) : R singulière, statistique non définie
+            diagonal = np.abs(np.diagonal(R, axis1=1, axis2=2))
+            valid = (np.ptp(block, axis=1) > 0) & np.all(diagonal > diagonal.max(axis=1, keepdims=True) * max(X.shape[1:]) * np.finfo(float).eps, axis=1)
+            Q, R, X, y = Q[valid], R[valid], X[valid], y[valid]
+            beta = np.linalg.solve(R, np.einsum('nti,nt->ni', Q, y)[..., None])[..., 0]
+            residuals = y - np.einsum('nti,ni->nt', X, beta)
+            sigma2 = np.einsum('nt,nt->n', residuals, residuals) / (nobs - X.shape[2])
+            R_inv = np.linalg.inv(R)
+            stats[start + np.flatnonzero(valid)] = beta[:, 0] / np.sqrt(sigma2 * np.einsum('ni,ni->n', R_inv[:, 0, :], R_inv[:, 0, :]))
+
+        from statsmodels.tsa.adfvalues import mackinnoncrit
 
+        critical_values = dict(zip(['1%', '5%', '10%'], mackinnoncrit(N=1, regression=self.regression, nobs=nobs)))
+        return {'stat': stats, 'pvalue': mackinnonp_batch(stats, self.regression), 'lags': lags, 'nobs': nobs, 'critical_values': critical_values}
+
+    def run(self, data, variables=None, hexagones=None):
+        """
+        Crible toutes les séries (hexagone, variable) : ADF par lots, puis adfuller avec autolag pour les cas limites
+        et les séries dégénérées pour la régression par lots (NaN si adfuller échoue aussi, par exemple série constante).
+
+        Paramètres :
+        - data (pd.DataFrame ou HexPartitionedData) : données de séries temporelles
+        - variables (list) : variables testées (par défaut precip_mean)
+        - hexagones (list) : hexagones testés (par défaut tous)
+
+        Retourne :
+        - results (pd.DataFrame) : colonnes h3_hex_id, Variable, Regression, Test Statistic, p-value, Lags Used, Résultat, Méthode
+        """
+        from statsmodels.tsa.stattools import adfuller
+
+        if not isinstance(data, HexPartitionedData):
+            data = HexPartitionedData(data)
+        variables = ['precip_mean'] if variables is None else variables
+        hexagones = data.hexagones if hexagones is None else [hex_id for hex_id in hexagones if hex_id in data]
+        pairs = [(hex_id, variable) for hex_id in hexagones for variable in variables]
+        series = [data.values(variable, hex_id).astype(float) for hex_id, variable in pairs]
+        series = [values[~np.isnan(values)] for values in series]
+        stats, pvalues, used_lags = np.full(len(pairs), np.nan), np.full(len(pairs), np.nan), np.full(len(pairs), np.nan)
+        method = np.full(len(pairs), 'batch', dtype=object)
+
+        lengths = np.array([len(values) for values in series])
+        degenerate = []
+        for n_days in np.unique(lengths):
+            indices = np.flatnonzero(lengths == n_days)
+            if not self._valid_lags(n_days, self._lags(n_days)):
+                continue
+            results = self.batch_adf(np.stack([series[i] for i in indices]))
+            stats[indices], pvalues[indices] = results['stat'], results['pvalue']
+            used_lags[indices] = np.where(np.isnan(results['stat']), np.nan, results['lags'])
+            degenerate.extend(indices[np.isnan(results['stat'])])
+
+        borderline = np.flatnonzero(np.abs(pvalues - self.alpha) < self.margin)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            for i in np.concatenate([borderline, degenerate]).astype(int):
+                try:
+                    adf_result = adfuller(series[i], regression=self.regression, autolag=self.autolag)
+                except (ValueError, np.linalg.LinAlgError, ZeroDivisionError):
+                    continue
+                stats[i], pvalues[i], used_lags[i], method[i] = adf_result[0], adf_result[1], adf_result[2], 'autolag'
+
+        return pd.DataFrame({
+            'h3_hex_id': [hex_id for hex_id, _ in pairs],
+            'Variable': [variable for _, variable in pairs],
+            'Regression': self.regression,
+            'Test Statistic': stats,
+            'p-value': pvalues,
+            'Lags Used': used_lags,
+            'Résultat': np.where(np.isnan(pvalues), None, np.where(pvalues < self.alpha, 'Stationnaire', 'Non Stationnaire')),
+            'Méthode': method,
+        })
+
+
+def get_stationarity_results(data_for_time_series, variables=None, n_jobs=None):
+    """
+    Calcule les résultats des tests de stationnarité (KPSS et ADF) pour chaque h3_hex_id unique dans le DataFrame fourni.
+
+    Paramètres :
+    - data_for_time_series (pd.DataFrame ou HexPartitionedData) : données de séries temporelles pour lesquelles les tests de stationnarité doivent être effectués.
+    - variables (list) : variables testées (par défaut precip_mean)
+    - n_jobs (int) : nombre de processus (cf StationarityBattery)
+
+    Retourne :
+    - stationarity_hex (pd.DataFrame) : DataFrame contenant les résultats des tests de stationnarité pour chaque h3_hex_id unique.
+    """
+    results = StationarityBattery('c', 'n', '5%', n_jobs=n_jobs).run(data_for_time_series, ['precip_mean'] if variables is None else variables)
+    results['p-value'] = results['p-value'].round(3)
+    results = results.drop('Test Statistic', axis=1)
+    return results.sort_values(['h3_hex_id', 'Variable', 'Regression'], ascending=[True, True, False])
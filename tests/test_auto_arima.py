@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+from h3 import h3
+from scripts.modeler.auto_arima import AutoARIMAModel
+from scripts.profiling import active_profiler
+
+
+def test_run_without_profiler(tmp_path):
+    assert active_profiler() is None
+    center = h3.geo_to_h3(48.8, 2.3, 5)
+    hexagones = [center, sorted(h3.k_ring(center, 1) - {center})[0]]
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2020-01-01", periods=60)
+    data = pd.concat([pd.DataFrame({"h3_hex_id": hex_id, "date": dates, "precip_mean": rng.gamma(0.5, 1, len(dates))}) for hex_id in hexagones], ignore_index=True)
+
+    model = AutoARIMAModel(seasonal=False, max_order=(2, 1, 2), n_jobs=1, cache_dir=str(tmp_path))
+    orders = model.run(data, hexagones)
+
+    assert set(orders) == set(hexagones)
+    assert all(np.isfinite(model.arima_models_mae[hex_id]) for hex_id in hexagones)
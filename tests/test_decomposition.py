@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from scripts.decomposition import STLDecomposer
+
+
+def daily_data(hexagones, days=70, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2020-01-01", periods=days)
+    return pd.concat([pd.DataFrame({"h3_hex_id": hex_id, "date": dates, "precip_mean": np.sin(np.arange(days) * 2 * np.pi / 7) + rng.normal(0, 0.1, days)})
+                      for hex_id in hexagones], ignore_index=True)
+
+
+def test_memory_cache_is_bounded():
+    decomposer = STLDecomposer(periods=(7,), n_jobs=1, max_cached=2)
+    decompositions = decomposer.run(daily_data(["a", "b", "c", "d"]))
+
+    assert set(decompositions) == {"a", "b", "c", "d"}
+    assert all(frame["trend"].notna().all() for frame in decompositions.values())
+    assert len(decomposer.cache) == 2
+
+
+def test_time_series_plots_do_not_share_a_decomposer():
+    from scripts.plotter.timeseries import TimeSeriesPlots
+
+    series = pd.Series(np.arange(30.0), index=pd.date_range("2020-01-01", periods=30))
+    first, second = TimeSeriesPlots(series), TimeSeriesPlots(series)
+
+    assert first.decomposer is not second.decomposer
+    assert first.decomposer.max_cached == TimeSeriesPlots.MAX_CACHED_DECOMPOSITIONS
+
+
+def test_deseasonalize_with_missing_days_keeps_components_aligned():
+    data = daily_data(["a"], days=84, seed=1)
+    train_end = data["date"].max() - pd.Timedelta(days=7)
+    gapped = data.drop(index=[20, 21, 22, 40, 55])
+    decomposer = STLDecomposer(periods=(7,), n_jobs=1)
+
+    full = decomposer.deseasonalize(data, train_end=train_end).set_index("date")
+    result = decomposer.deseasonalize(gapped, train_end=train_end).set_index("date")
+
+    test_days = result.index > train_end
+    assert result["precip_mean_deseason"].notna().all()
+    # la saisonnalité prolongée suit le jour de la semaine : le résidu sur la période de test reste au niveau du bruit
+    assert result.loc[test_days, "precip_mean_deseason"].abs().max() < 0.5
+    np.testing.assert_allclose(result.loc[test_days, "precip_mean_deseason"], full.loc[result.index[test_days], "precip_mean_deseason"], atol=0.1)
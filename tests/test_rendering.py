@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scripts.plotter.rendering import DownsampledFigure, max_indices, minmax_indices
+
+
+def test_minmax_indices_ignores_missing_values():
+    assert list(minmax_indices([np.nan, 5, 6, 7, 8, 9], 1)) == [1, 5]
+    assert list(minmax_indices([np.nan, np.nan, 3, 1, np.nan, np.nan, np.nan], 3)) == [2, 3]
+
+
+def test_max_indices_keeps_each_bucket_maximum():
+    y = np.array([1.0, 9.0, 2.0, np.nan, 3.0, 0.0, np.nan, np.nan])
+    assert list(max_indices(y, 4)) == [1, 2, 4]
+
+
+@pytest.mark.parametrize("method", ["minmax", "lttb"])
+@pytest.mark.parametrize("n_points", [1000, 2000, 999])
+def test_downsample_respects_point_budget(method, n_points):
+    rng = np.random.default_rng(0)
+    y = rng.gamma(0.3, 1, 100_000)
+    y[rng.random(len(y)) < 0.05] = np.nan
+    x = pd.date_range("2000-01-01", periods=len(y), freq="H").to_numpy()
+
+    x_sampled, y_sampled = DownsampledFigure(n_points=n_points, method=method).downsample(x, y)
+
+    assert len(y_sampled) <= n_points
+    assert np.nanmax(y_sampled) == np.nanmax(y)
+
+
+def test_plot_forecast_threads_interactive(monkeypatch):
+    from scripts.plotter import forecast
+
+    shown = []
+    monkeypatch.setattr(DownsampledFigure, "show", lambda self, interactive=False: shown.append((self, interactive)))
+    forecast.plot_forecast(np.arange(5000.0), np.arange(5000.0), 0.0, "test", n_points=500, interactive=True)
+
+    figure, interactive = shown[0]
+    assert interactive
+    assert len(figure.series) == 2
+    assert figure.layout["annotations"][0]["text"] == "Mean Absolute Error: 0.0000"
+    assert len(figure.build().data[0].x) <= 500
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+from scripts.modeler.search import HyperparameterSearch
+
+
+def hourly_data(hexagones, days=60, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2020-01-01", periods=days * 24, freq="H")
+    frames = []
+    for i, hex_id in enumerate(hexagones):
+        frame = pd.DataFrame({"h3_hex_id": hex_id, "date": dates})
+        for column in ["dd", "ff", "hu", "t", "td", "psl"]:
+            frame[column] = rng.normal(size=len(dates))
+        frame["precip"] = np.clip(rng.gamma(0.3, 1, len(dates)) - 0.1, 0, None)
+        for k in range(3):
+            frame[f"h3_hex_id_neighbor_{k}"] = hexagones[(i + k + 1) % len(hexagones)]
+            frame[f"h3_hex_id_neighbor_{k}_precip"] = rng.gamma(0.3, 1, len(dates))
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def count_lines(path):
+    with open(path) as file:
+        return sum(1 for line in file if line.strip())
+
+
+def test_search_sarimax_recomputes_only_stale_hexagons(tmp_path):
+    results_file = str(tmp_path / "results.jsonl")
+    hexagones = ["h0", "h1"]
+    space = {"nb_lag_var": [1, 2], "nb_lag_exo": [0]}
+    data = hourly_data(hexagones)
+
+    HyperparameterSearch(results_file, n_jobs=1).search_sarimax(data, hexagones, space)
+    assert count_lines(results_file) == 4
+
+    search = HyperparameterSearch(results_file, n_jobs=1)
+    search.search_sarimax(data, hexagones, space)
+    assert count_lines(results_file) == 4
+
+    updated = data.copy()
+    updated.loc[updated["h3_hex_id"] == "h1", "precip"] += 1.0
+    summary = search.search_sarimax(updated, hexagones, space)
+    assert count_lines(results_file) == 6
+    assert (summary["n_hex"] == 2).all()
+
+
+class _MeanModel:
+    """Modèle minimal (sans TensorFlow) : prédit la moyenne des cibles vues par fit."""
+
+    def __init__(self, time_steps):
+        self.time_steps = time_steps
+        self.level = 0.0
+
+    def fit(self, X, y, validation_data=None, initial_epoch=0, epochs=1, verbose=0):
+        self.level = float(np.mean(y))
+
+    def predict(self, X, verbose=0):
+        return np.full((len(X), 1), self.level)
+
+
+def test_successive_halving_uses_lstm_defaults(monkeypatch):
+    from scripts.modeler import search
+    from scripts.modeler.lstm import LSTMModel
+
+    monkeypatch.setattr(LSTMModel, "create_model", lambda self, num_features, *args: _MeanModel(self.time_steps))
+    rng = np.random.default_rng(0)
+    daily = pd.DataFrame({"h3_hex_id": "h0", "date": pd.date_range("2020-01-01", periods=80), "precip_mean": rng.gamma(0.5, 1, 80), "t": rng.normal(size=80)})
+
+    hex_id, runs = search._successive_halving_lstm_hex("h0", daily, [{"units": 8}, {"units": 16, "epochs": 10}], min_epochs=5, eta=2)
+
+    assert hex_id == "h0"
+    assert {run["config"]["units"]: run["epochs"] for run in runs if run["status"] == "complete"} in ({8: 50}, {16: 10})
+    assert max(run["epochs"] for run in runs) <= search.LSTM_DEFAULTS["epochs"]
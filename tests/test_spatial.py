@@ -0,0 +1,28 @@
+import numpy as np
+from scripts.processor.spatial import SpatialCrossCorrelation
+
+
+def test_top_k_donors_never_returns_the_hexagon_itself():
+    rng = np.random.default_rng(0)
+    array = rng.normal(size=(3, 100))
+    # A et B ne sont observés ensemble que 20 jours (< min_periods), C seulement 10 jours : aucun donneur valide
+    array[0, 50:] = np.nan
+    array[1, :30] = np.nan
+    array[2, 10:] = np.nan
+    correlation = SpatialCrossCorrelation(lag=1, min_periods=30).fit_array(["A", "B", "C"], array)
+
+    donors = correlation.top_k_donors(k=2)
+
+    assert (donors["donor_hex_id"] != donors["h3_hex_id"]).all()
+    assert donors["correlation"].notna().all()
+
+
+def test_top_k_donors_with_fewer_valid_donors_than_k():
+    rng = np.random.default_rng(1)
+    array = rng.normal(size=(3, 100))
+    array[2, 10:] = np.nan
+    correlation = SpatialCrossCorrelation(lag=1, min_periods=30).fit_array(["A", "B", "C"], array)
+
+    donors = correlation.top_k_donors(k=2)
+
+    assert donors.set_index("h3_hex_id")["donor_hex_id"].to_dict() == {"A": "B", "B": "A"}